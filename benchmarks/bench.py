@@ -0,0 +1,255 @@
+"""Benchmarks for the StecaGrid integration.
+
+Run from the repository root. The cycle benchmarks need Home Assistant
+installed, --codec-only does not:
+
+    python -m benchmarks.bench
+    python -m benchmarks.bench --save baseline.json
+    python -m benchmarks.bench --compare baseline.json --max-regression 0.2
+    python -m benchmarks.bench --codec-only --capture inverter.cap
+
+The codec benchmarks report operations per second. The cycle benchmarks run
+full StecaGridCoordinator._async_update_data cycles (every measurement read)
+against the bundled simulator and report cycle latency percentiles and the
+memory allocated per cycle. With --compare the run fails if a result is worse
+than the baseline by more than --max-regression. With --capture the telegrams
+of a capture file (see capture.py) are read and their responses decoded, as
+complete passes over the file per second.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# The codec is imported through the stecagrid package, which does not load
+# Home Assistant; the cycle benchmarks import it when they run
+from stecagrid.capture import DIRECTION_RX, CaptureReader
+from stecagrid.crc import crc8_block, crc16_block
+from stecagrid.measurements import MEASUREMENTS_BY_KEY
+from stecagrid.response import StecaResponse
+from stecagrid.simulator import SimulatedInverter
+from stecagrid.steca import StecaConnector, StecaFrameDecoder
+
+CODEC_MIN_TIME = 0.2
+CYCLE_LATENCIES = (0.0, 0.002, 0.01)
+CYCLE_INVERTERS = (1, 4, 16)
+CYCLES = 20
+
+
+def codec_benchmarks():
+    """Return the codec benchmarks as name -> callable."""
+    connector = StecaConnector("127.0.0.1", 0)
+    telegram = connector.GenerateRequestTelegram(41)
+    response = SimulatedInverter().respond(41)
+    ac_power = MEASUREMENTS_BY_KEY["ac_power"]
+    record = response[ac_power.offset : ac_power.offset + 4]
+
+    return {
+        "telegram_cached": lambda: connector.GenerateRequestTelegram(41),
+        "telegram_build": lambda: connector.BuildRequestTelegram(b"\x29"),
+        "crc8_header": lambda: crc8_block(0x55, telegram[:6]),
+        "crc16_telegram": lambda: crc16_block(0x5555, telegram[:-3]),
+        "formula_to_float": lambda: connector.formulaToFloat(record),
+        "formula_to_sint": lambda: connector.formulaToSInt(record[1:3]),
+        "response_parse": lambda: StecaResponse(response, ac_power.offset),
+        "response_lookup": lambda: StecaResponse(response, ac_power.offset).value(
+            ac_power.formula
+        ),
+    }
+
+
+def capture_benchmarks(path):
+    """Return the benchmarks on a capture file as name -> callable."""
+    reader = CaptureReader(path)
+
+    def read():
+        for _ in reader:
+            pass
+
+    def decode():
+        decoder = StecaFrameDecoder()
+        for record in reader:
+            if record.direction == DIRECTION_RX:
+                decoder.feed(record.frame)
+                while decoder.next_frame() is not None:
+                    pass
+
+    return {"capture_read": read, "capture_decode": decode}
+
+
+def run_codec(min_time=CODEC_MIN_TIME, capture=None):
+    results = {}
+    benchmarks = codec_benchmarks()
+    if capture:
+        benchmarks.update(capture_benchmarks(capture))
+    for name, func in benchmarks.items():
+        loops = 1
+        while True:
+            start = time.perf_counter()
+            for _ in range(loops):
+                func()
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                break
+            loops *= 2
+        results[f"codec.{name}"] = {"ops": loops / elapsed}
+    return results
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+async def run_cycle(hass, latency, inverters, cycles):
+    """Time full update cycles of `inverters` coordinators behind one gateway."""
+    # The coordinator must get the connector of its own package, not the one
+    # loaded through stecagrid
+    # pylint: disable-next=import-outside-toplevel
+    from custom_components.stecagrid import StecaGridCoordinator, simulator, steca
+
+    simulated = [
+        simulator.SimulatedInverter(address) for address in range(1, inverters + 1)
+    ]
+    async with simulator.StecaSimulator(simulated, latency=latency) as sim:
+        bus = steca.StecaBus(sim.host, sim.port)
+        coordinators = [
+            StecaGridCoordinator(
+                hass,
+                steca.StecaConnector(sim.host, sim.port, bus, inverter.address),
+                f"bench {inverter.address}",
+                5,
+            )
+            for inverter in simulated
+        ]
+
+        async def cycle():
+            for coordinator in coordinators:
+                # Make every measurement due, not only the fast ones
+                coordinator._next_read.clear()
+            await asyncio.gather(
+                *(coordinator._async_update_data() for coordinator in coordinators)
+            )
+
+        await cycle()  # connect and warm up
+
+        durations = []
+        allocated = []
+        tracemalloc.start()
+        try:
+            for _ in range(cycles):
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                start = time.perf_counter()
+                await cycle()
+                durations.append(time.perf_counter() - start)
+                allocated.append(tracemalloc.get_traced_memory()[1] - before)
+        finally:
+            tracemalloc.stop()
+            await bus.close()
+
+    return {
+        "p50": percentile(durations, 50),
+        "p95": percentile(durations, 95),
+        "p99": percentile(durations, 99),
+        "alloc": statistics.mean(allocated),
+    }
+
+
+async def run_cycles(latencies, inverter_counts, cycles):
+    # pylint: disable-next=import-outside-toplevel
+    from homeassistant.core import HomeAssistant
+
+    results = {}
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = HomeAssistant(config_dir)
+        for latency in latencies:
+            for inverters in inverter_counts:
+                results[f"cycle.latency={latency}.inverters={inverters}"] = (
+                    await run_cycle(hass, latency, inverters, cycles)
+                )
+        await hass.async_stop(force=True)
+    return results
+
+
+def compare(results, baseline, max_regression):
+    """Return the results that regressed more than max_regression."""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        for metric, value in result.items():
+            reference = baseline[name].get(metric)
+            if not reference:
+                continue
+            # More operations per second is better, everything else is worse
+            change = (
+                (reference - value) / reference
+                if metric == "ops"
+                else (value - reference) / reference
+            )
+            if change > max_regression:
+                regressions.append(f"{name} {metric}: {reference:.6g} -> {value:.6g}")
+    return regressions
+
+
+def print_results(results):
+    for name, result in results.items():
+        if "ops" in result:
+            print(f"{name:50} {result['ops']:14,.0f} ops/s")
+        else:
+            print(
+                f"{name:50} p50 {result['p50'] * 1000:8.2f} ms"
+                f"  p95 {result['p95'] * 1000:8.2f} ms"
+                f"  p99 {result['p99'] * 1000:8.2f} ms"
+                f"  {result['alloc'] / 1024:8.1f} KiB/cycle"
+            )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--codec-only", action="store_true")
+    parser.add_argument("--cycles", type=int, default=CYCLES)
+    parser.add_argument(
+        "--latency", type=float, action="append", help="simulated latency (s)"
+    )
+    parser.add_argument("--inverters", type=int, action="append")
+    parser.add_argument("--save", metavar="FILE", help="store results as baseline")
+    parser.add_argument("--compare", metavar="FILE", help="baseline to compare with")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    parser.add_argument("--capture", metavar="FILE", help="capture file to decode")
+    args = parser.parse_args(argv)
+
+    results = run_codec(capture=args.capture)
+    if not args.codec_only:
+        results.update(
+            asyncio.run(
+                run_cycles(
+                    args.latency or CYCLE_LATENCIES,
+                    args.inverters or CYCLE_INVERTERS,
+                    args.cycles,
+                )
+            )
+        )
+    print_results(results)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            regressions = compare(results, json.load(file), args.max_regression)
+        if regressions:
+            print("Regressions:", *regressions, sep="\n  ")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,15 +3,60 @@
 import asyncio
 from datetime import timedelta
 import logging
+import math
+import os
+import time
 
 import voluptuous as vol
 
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
-from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP, SUN_EVENT_SUNRISE
+from homeassistant.core import (
+    Event,
+    HomeAssistant,
+    ServiceCall,
+    ServiceResponse,
+    SupportsResponse,
+)
+from homeassistant.exceptions import ServiceValidationError
+from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.helpers.sun import get_astral_event_next, is_up
+from homeassistant.helpers.update_coordinator import (
+    DataUpdateCoordinator,
+    UpdateFailed,
+)
+from homeassistant.util import dt as dt_util, slugify
 
-from .const import DOMAIN
-from .steca import StecaConnector
+from .capture import CaptureWriter
+from .const import (
+    CONF_HEARTBEAT,
+    CONF_HIGH_RATE,
+    CONF_INVERTER_ADDRESSES,
+    CONF_PIPELINE,
+    CYCLE_BUDGET,
+    DATA_BUSES,
+    DATA_FLEET,
+    DEFAULT_HEARTBEAT,
+    DEFAULT_INVERTER_ADDRESS,
+    DOMAIN,
+    HIGH_RATE_INTERVAL,
+    SERVICE_CAPTURE,
+    SERVICE_GET_RECENT,
+    SIGNAL_AC_SAMPLE,
+    SLEEP_INTERVAL_DAY_MAX,
+    SLEEP_INTERVAL_MAX,
+)
+from .fleet import StecaFleet
+from .measurements import DECODE_FLOAT, MEASUREMENTS, MEASUREMENTS_BY_KEY
+from .sampling import RECENT_SIZE, SampleRing, downsample
+from .steca import (
+    PRIORITY_LOW,
+    StecaBus,
+    StecaConnectionError,
+    StecaConnector,
+    StecaInvalidResponse,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -19,35 +64,173 @@ CONFIG_SCHEMA = vol.Schema({DOMAIN: vol.Schema({})}, extra=vol.ALLOW_EXTRA)
 
 PLATFORMS = ["sensor"]
 
+RECENT_MEASUREMENTS = [
+    measurement.key
+    for measurement in MEASUREMENTS
+    if measurement.decoder == DECODE_FLOAT
+]
+
+GET_RECENT_SCHEMA = vol.Schema(
+    {
+        vol.Required("measurement"): vol.In(RECENT_MEASUREMENTS),
+        vol.Optional("alias"): cv.string,
+        vol.Optional("minutes", default=10): vol.All(
+            vol.Coerce(float), vol.Range(min=0, min_included=False)
+        ),
+        vol.Optional("points", default=60): vol.All(
+            vol.Coerce(int), vol.Range(min=1, max=RECENT_SIZE)
+        ),
+    }
+)
+
 
 async def async_setup(hass: HomeAssistant, config: dict):
     """Set up the StecaGrid component."""
 
     hass.data[DOMAIN] = {}
+
+    # All inverters are polled by one scheduler instead of a timer each
+    fleet = hass.data[DOMAIN][DATA_FLEET] = StecaFleet()
+
+    async def async_close_fleet(event: Event) -> None:
+        await fleet.close()
+
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_close_fleet)
+
+    async def async_get_recent(call: ServiceCall) -> ServiceResponse:
+        """Return the recent values of a measurement from memory."""
+        return _get_recent(hass, call.data)
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_GET_RECENT,
+        async_get_recent,
+        schema=GET_RECENT_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
+
+    async def async_capture(call: ServiceCall) -> None:
+        """Start or stop capturing the traffic of the inverters' gateways."""
+        buses = {
+            id(coordinator.stecaApi._bus): coordinator.stecaApi._bus
+            for coordinator in _get_coordinators(hass, call.data.get("alias"))
+        }
+        await asyncio.gather(
+            *(
+                _async_set_capture(hass, bus, call.data["enabled"])
+                for bus in buses.values()
+            )
+        )
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_CAPTURE,
+        async_capture,
+        schema=vol.Schema(
+            {
+                vol.Required("enabled"): cv.boolean,
+                vol.Optional("alias"): cv.string,
+            }
+        ),
+    )
     return True
 
 
+def _get_coordinators(hass: HomeAssistant, alias=None):
+    """Return the coordinators of all loaded entries, or the one with alias."""
+    coordinators = [
+        coordinator
+        for stecagrid in hass.data[DOMAIN].values()
+        if isinstance(stecagrid, HassStecaGrid)
+        for coordinator in stecagrid._coordinators
+        if alias in (None, coordinator._alias)
+    ]
+    if not coordinators:
+        raise ServiceValidationError(f"No StecaGrid inverter {alias}")
+    return coordinators
+
+
+def _get_recent(hass: HomeAssistant, data) -> ServiceResponse:
+    """Downsample the recent values of the inverters, by alias."""
+    coordinators = _get_coordinators(hass, data.get("alias"))
+
+    end = dt_util.utcnow().timestamp()
+    start = end - data["minutes"] * 60
+    return {
+        coordinator._alias: [
+            {
+                "start": dt_util.utc_from_timestamp(bucket["start"]).isoformat(),
+                "min": round(bucket["min"], 3),
+                "max": round(bucket["max"], 3),
+                "mean": round(bucket["mean"], 3),
+            }
+            for bucket in downsample(
+                coordinator._recent[data["measurement"]].samples(),
+                start,
+                end,
+                data["points"],
+            )
+        ]
+        for coordinator in coordinators
+    }
+
+
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
     """Set up StecaGrid from a config entry."""
     inverter_host = entry.data["inverter_host"]
     inverter_port = entry.data["inverter_port"]
     inverter_scaninterval = entry.data["scan_interval"]
     inverter_alias = entry.data["alias"]
+    heartbeat = entry.data.get(CONF_HEARTBEAT, DEFAULT_HEARTBEAT)
+    high_rate = entry.data.get(CONF_HIGH_RATE, False)
+    pipeline = entry.data.get(CONF_PIPELINE, False)
+    inverter_addresses = entry.data.get(
+        CONF_INVERTER_ADDRESSES, [DEFAULT_INVERTER_ADDRESS]
+    )
 
-    stecaApi = StecaConnector(inverter_host, inverter_port)
+    # All inverters behind the gateway share one connection
+    bus = _async_get_bus(hass, inverter_host, inverter_port, pipeline)
 
-    # Fetch initial data so we have data when entities subscribe
-    coordinator = StecaGridCoordinator(
-        hass, stecaApi, inverter_alias, inverter_scaninterval
-    )
-    await coordinator.async_config_entry_first_refresh()
+    coordinators = []
+    for address in inverter_addresses:
+        stecaApi = StecaConnector(inverter_host, inverter_port, bus, address)
+        alias = (
+            inverter_alias
+            if len(inverter_addresses) == 1
+            else f"{inverter_alias} {address}"
+        )
+        coordinators.append(
+            StecaGridCoordinator(
+                hass,
+                stecaApi,
+                alias,
+                inverter_scaninterval,
+                heartbeat,
+                high_rate,
+            )
+        )
+
+    # Fetch initial data so we have data when entities subscribe. A failed
+    # refresh must not hold up the setup: at night every inverter is silent
+    # and is only marked asleep after a few cycles.
+    await asyncio.gather(*(coordinator.async_refresh() for coordinator in coordinators))
 
     hass.data[DOMAIN][entry.entry_id] = HassStecaGrid(
-        coordinator, inverter_host, inverter_port
+        coordinators, inverter_host, inverter_port
     )
 
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
 
+    fleet = hass.data[DOMAIN][DATA_FLEET]
+    for coordinator in coordinators:
+        fleet.add(
+            (entry.entry_id, coordinator.stecaApi.address),
+            coordinator.async_fleet_poll,
+            inverter_scaninterval,
+        )
+        if high_rate:
+            coordinator.async_start_sampling()
+
     return True
 
 
@@ -62,21 +245,74 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
         )
     )
     if unload_ok:
-        hass.data[DOMAIN].pop(entry.entry_id)
+        stecagrid = hass.data[DOMAIN].pop(entry.entry_id)
+        for coordinator in stecagrid._coordinators:
+            hass.data[DOMAIN][DATA_FLEET].remove(
+                (entry.entry_id, coordinator.stecaApi.address)
+            )
+        await _async_release_bus(
+            hass, stecagrid._inverter_host, stecagrid._inverter_port
+        )
 
     return unload_ok
 
 
+def _async_get_bus(
+    hass: HomeAssistant, host: str, port: int, pipeline: bool = False
+) -> StecaBus:
+    """Return the bus for a gateway, shared by all entries using it."""
+    buses = hass.data[DOMAIN].setdefault(DATA_BUSES, {})
+    if (host, port) not in buses:
+        buses[(host, port)] = StecaBus(host, port, pipeline)
+    return buses[(host, port)]
+
+
+async def _async_release_bus(hass: HomeAssistant, host: str, port: int):
+    """Close the bus for a gateway once no loaded entry uses it anymore."""
+    for stecagrid in hass.data[DOMAIN].values():
+        if (
+            isinstance(stecagrid, HassStecaGrid)
+            and stecagrid._inverter_host == host
+            and stecagrid._inverter_port == port
+        ):
+            return
+
+    bus = hass.data[DOMAIN].get(DATA_BUSES, {}).pop((host, port), None)
+    if bus is not None:
+        await _async_set_capture(hass, bus, False)
+        await bus.close()
+
+
+async def _async_set_capture(hass: HomeAssistant, bus: StecaBus, enabled: bool):
+    """Start or stop writing the traffic of a gateway to a capture file.
+
+    The file is <config>/stecagrid/<host>_<port>.cap. Opening and closing it
+    block, they run in the executor.
+    """
+    capture = bus.capture
+    if enabled and capture is None:
+        path = hass.config.path(DOMAIN, f"{slugify(bus._host)}_{bus._port}.cap")
+        bus.capture = await hass.async_add_executor_job(_open_capture, path)
+        _LOGGER.info(f"Capturing gateway {bus._host}:{bus._port} to {path}")
+    elif not enabled and capture is not None:
+        bus.capture = None
+        await hass.async_add_executor_job(capture.close)
+        _LOGGER.info(f"Captured {capture.frames} records to {capture.path}")
+
+
 class HassStecaGrid:
     def __init__(
-        self, coordinator: DataUpdateCoordinator, inverter_host: str, inverter_port: int
+        self,
+        coordinators: list[DataUpdateCoordinator],
+        inverter_host: str,
+        inverter_port: int,
     ):
         self._inverter_host = inverter_host
         self._inverter_port = inverter_port
         _LOGGER.debug("Stecagrid __init__" + self._inverter_host)
 
-        # create an instance of StecaConnector
-        self._coordinator = coordinator
+        # one coordinator per inverter on the gateway
+        self._coordinators = coordinators
 
     def get_name(self):
         return f"steca_grid_{self._inverter_host}_{str(self._inverter_port)}"
@@ -88,38 +324,205 @@ class HassStecaGrid:
 class StecaGridCoordinator(DataUpdateCoordinator):
     """StecaGrid coordinator."""
 
-    def __init__(self, hass, stecaAPI: StecaConnector, alias: str, pollinterval: int):
+    def __init__(
+        self,
+        hass,
+        stecaAPI: StecaConnector,
+        alias: str,
+        pollinterval: int,
+        heartbeat: int = DEFAULT_HEARTBEAT,
+        high_rate: bool = False,
+    ):
         """Initialize my coordinator."""
         super().__init__(
             hass,
             _LOGGER,
             # Name of the data. For logging purposes.
             name=f"StecaGrid coordinator for '{alias}'",
-            # Polling interval. Will only be polled if there are subscribers.
-            update_interval=timedelta(seconds=pollinterval),
+            # Polled by the StecaFleet, at poll_interval
+            update_interval=None,
+            # Listeners are called every cycle, the sensors skip writing
+            # unchanged states until their heartbeat is due
+            always_update=True,
         )
         self.stecaApi = stecaAPI
         self._alias = alias
+        # Time until the next poll, longer while the inverter is asleep
+        self.poll_interval = timedelta(seconds=pollinterval)
+        # Seconds after which sensors write their state even if unchanged
+        self.heartbeat = heartbeat
+
+        # Measurements are read on their own schedule, the latest value of
+        # each is kept here and published every cycle.
+        self._intervals = {
+            measurement.key: math.inf
+            if measurement.poll_interval is None
+            else max(measurement.poll_interval, pollinterval)
+            for measurement in MEASUREMENTS
+        }
+        self._next_read: dict[str, float] = {}
+        self._values = {}
+        # Monotonic time each value was last read
+        self._read_at: dict[str, float] = {}
+        # Cycles do not start exactly on time, allow reading a little early
+        self._slack = pollinterval / 2
+        self._pollinterval = timedelta(seconds=pollinterval)
+        # AC power samples of the high-rate mode, None when it is off
+        self._samples = SampleRing() if high_rate else None
+        self.sample_signal = SIGNAL_AC_SAMPLE.format(alias)
+        # Recent values by measurement key, with their UTC timestamps
+        self._recent = {key: SampleRing(RECENT_SIZE) for key in RECENT_MEASUREMENTS}
 
     async def _async_update_data(self):
         # Fetch data from API endpoint. This is the place to pre-process the data to lookup tables so entities can quickly look up their data.
 
-        try:
-            retData = {}
-            async with asyncio.timeout(3):
-                retData["ac_power"] = await self.stecaApi.GetACOutput()
-                retData["panel_power"] = await self.stecaApi.GetPanelOutput()
-                retData["panel_voltage"] = await self.stecaApi.GetPanelVoltage()
-                retData["panel_current"] = await self.stecaApi.GetPanelCurrent()
-                retData["daily_yield"] = await self.stecaApi.GetDailyYield()
-                retData["time"] = await self.stecaApi.GetInverterTime()
-                
-                return retData
-        except:
-            _LOGGER.error("StecaGridCoordinator _async_update_data failed")
-        # except ApiAuthError as err:
-        #     # Raising ConfigEntryAuthFailed will cancel future updates
-        #     # and start a config flow with SOURCE_REAUTH (async_step_reauth)
-        #     raise ConfigEntryAuthFailed from err
-        # except ApiError as err:
-        #     raise UpdateFailed(f"Error communicating with API: {err}")
+        if self.stecaApi.asleep:
+            # Only probe a sleeping inverter, with growing intervals
+            if not await self.stecaApi.Probe():
+                return self._async_sleep()
+            self._async_wake_up()
+
+        now = time.monotonic()
+        stats = self.stecaApi.stats
+        due = [
+            key
+            for key in MEASUREMENTS_BY_KEY
+            if self._next_read.get(key, 0) <= now + self._slack
+        ]
+
+        # In high-rate mode the AC power of the cycle is the mean of the
+        # samples, it is only read here if there were none
+        summary = self._samples.drain() if self._samples is not None else None
+        if summary is not None:
+            summary = {key: round(value, 1) for key, value in summary.items()}
+            if "ac_power" in due:
+                due.remove("ac_power")
+            self._values["ac_power"] = summary["mean"]
+            self._read_at["ac_power"] = now
+            self._add_recent("ac_power", summary["mean"])
+
+        # All due measurements are requested in one batch, each must be answered
+        # within the cycle budget
+        deadline = asyncio.get_running_loop().time() + CYCLE_BUDGET
+        results = (
+            await self.stecaApi.GetMeasurements(
+                (MEASUREMENTS_BY_KEY[key] for key in due), deadline=deadline
+            )
+            if due
+            else {}
+        )
+        failed = []
+        for key, value in results.items():
+            if isinstance(value, Exception):
+                failed.append(key)
+                continue
+            self._values[key] = value
+            self._read_at[key] = now
+            self._add_recent(key, value)
+            self._next_read[key] = now + self._intervals[key]
+        stats.add_cycle(time.monotonic() - now, not failed)
+
+        if failed:
+            if self.stecaApi.asleep:
+                return self._async_sleep()
+            # Values that could not be decoded are only stale, the inverter
+            # did answer
+            unanswered = [
+                key
+                for key in failed
+                if not isinstance(results[key], StecaInvalidResponse)
+            ]
+            if len(unanswered) == len(results):
+                raise UpdateFailed(
+                    f"No response from inverter {self.stecaApi.address}: {results[failed[0]]}"
+                )
+            _LOGGER.debug(f"{self.name}: no {', '.join(failed)} this cycle")
+
+        return {
+            **self._values,
+            # Seconds since the values that were due, but not read, were read
+            "stale": {
+                key: round(now - self._read_at[key])
+                for key in failed
+                if key in self._read_at
+            },
+            "ac_power_samples": summary,
+        }
+
+    def _async_sleep(self):
+        """Back off while the inverter is asleep and publish zero production."""
+        interval = min(
+            max(self.poll_interval * 2, self._pollinterval),
+            timedelta(seconds=SLEEP_INTERVAL_MAX),
+        )
+        if is_up(self.hass):
+            # Asleep in daylight is unusual, keep checking often
+            interval = min(interval, timedelta(seconds=SLEEP_INTERVAL_DAY_MAX))
+        else:
+            # Do not sleep through the sunrise
+            sunrise = get_astral_event_next(self.hass, SUN_EVENT_SUNRISE)
+            interval = max(
+                min(interval, sunrise - dt_util.utcnow()), self._pollinterval
+            )
+        if interval != self.poll_interval:
+            _LOGGER.debug(f"{self.name}: inverter asleep, next probe in {interval}")
+        self.poll_interval = interval
+
+        for measurement in MEASUREMENTS:
+            if measurement.zero_when_asleep:
+                self._values[measurement.key] = 0.0
+                self._add_recent(measurement.key, 0.0)
+        return dict(self._values)
+
+    def _add_recent(self, key, value):
+        if key in self._recent:
+            self._recent[key].add(value, dt_util.utcnow().timestamp())
+
+    def _async_wake_up(self):
+        """Return to the normal cadence and refresh everything right away."""
+        self.poll_interval = self._pollinterval
+        self._next_read = {
+            key: next_read
+            for key, next_read in self._next_read.items()
+            if next_read == math.inf
+        }
+
+    async def async_fleet_poll(self):
+        """Refresh, called by the StecaFleet. Returns the seconds until the next."""
+        await self.async_refresh()
+        return self.poll_interval.total_seconds()
+
+    def async_start_sampling(self):
+        """Start reading the AC power continuously (high-rate mode)."""
+        if self.config_entry is None:
+            return
+        self.config_entry.async_create_background_task(
+            self.hass, self._async_sample(), f"{self.name} sampling"
+        )
+
+    async def _async_sample(self):
+        """Read the AC power as fast as the bus allows, behind regular reads."""
+        measurement = MEASUREMENTS_BY_KEY["ac_power"]
+        loop = asyncio.get_running_loop()
+        while True:
+            if self.stecaApi.asleep:
+                # Probing is left to the regular cycles
+                await asyncio.sleep(self._pollinterval.total_seconds())
+                continue
+            start = loop.time()
+            try:
+                value = await self.stecaApi.GetMeasurement(
+                    measurement, PRIORITY_LOW, retries=0
+                )
+            except StecaConnectionError:
+                await asyncio.sleep(self._pollinterval.total_seconds())
+                continue
+            now = time.monotonic()
+            self._samples.add(value, now)
+            async_dispatcher_send(self.hass, self.sample_signal, value, now)
+            await asyncio.sleep(max(0.0, start + HIGH_RATE_INTERVAL - loop.time()))
+
+
+def _open_capture(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return CaptureWriter(path)
@@ -0,0 +1,264 @@
+"""Binary capture of the traffic between a gateway and StecaGrid inverters.
+
+A capture file is the magic b"STECACAP\\x01" followed by one record per
+telegram sent and per chunk of bytes received:
+
+    monotonic time (double) | direction (0 sent, 1 received) | length (2) | data
+
+in network byte order. Received data is recorded as read from the gateway,
+before decoding, so corrupted, truncated and stray bytes are kept. CaptureWriter
+appends to a file from a thread of its own and rotates it like logging's
+RotatingFileHandler (capture.bin, capture.bin.1, ...). CaptureReader
+memory-maps a file and yields the data as memoryviews into the map, without
+copying it. CaptureReplay serves a capture as a gateway, answering every
+request with the responses recorded for it, so a connector or a coordinator
+can be run against real traffic offline.
+"""
+
+import asyncio
+from collections import deque
+from logging import getLogger
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+from typing import NamedTuple
+
+from .steca import REQUEST_IDENTIFIER_POS, StecaFrameDecoder
+
+_LOGGER = getLogger(__name__)
+
+CAPTURE_MAGIC = b"STECACAP\x01"
+# Size at which a capture file is rotated and the rotated files kept
+CAPTURE_MAX_BYTES = 10 * 1024 * 1024
+CAPTURE_BACKUPS = 3
+
+DIRECTION_TX = "tx"
+DIRECTION_RX = "rx"
+_DIRECTIONS = (DIRECTION_TX, DIRECTION_RX)
+_RECORD = struct.Struct(">dBH")
+
+
+class CaptureRecord(NamedTuple):
+    time: float
+    direction: str
+    frame: memoryview
+
+
+class CaptureWriter:
+    """Appends records to a capture file, rotating it by size.
+
+    write() only queues the record, so it can be called from the event loop.
+    A thread writes the records, buffered, and rotates the file. The file is
+    opened by the constructor and closed by close(), both block and belong in
+    an executor when used from the event loop.
+    """
+
+    def __init__(self, path, max_bytes=CAPTURE_MAX_BYTES, backups=CAPTURE_BACKUPS):
+        self.path = path
+        self._max_bytes = max_bytes
+        self._backups = backups
+        self.frames = 0
+        self._file = None
+        self._open()
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread = threading.Thread(
+            target=self._run, name=f"capture {path}", daemon=True
+        )
+        self._thread.start()
+
+    def write(self, direction, frame, now=None):
+        """Queue a record, direction is DIRECTION_TX or DIRECTION_RX."""
+        if self._thread is None or not self._thread.is_alive():
+            # Closed, or stopped by a write error
+            return
+        self._queue.put(
+            (
+                time.monotonic() if now is None else now,
+                _DIRECTIONS.index(direction),
+                bytes(frame),
+            )
+        )
+        self.frames += 1
+
+    def close(self):
+        """Write the queued records and close the file."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _run(self):
+        try:
+            while (record := self._queue.get()) is not None:
+                when, direction, frame = record
+                size = _RECORD.size + len(frame)
+                if self._size + size > self._max_bytes and self._size > len(
+                    CAPTURE_MAGIC
+                ):
+                    # Full, unless it only holds the magic
+                    self._rotate()
+                self._file.write(_RECORD.pack(when, direction, len(frame)))
+                self._file.write(frame)
+                self._size += size
+        except OSError:
+            _LOGGER.exception(f"Capture to {self.path} stopped")
+
+    def _open(self):
+        self._file = open(self.path, "ab")
+        self._size = self._file.tell()
+        if not self._size:
+            self._file.write(CAPTURE_MAGIC)
+            self._size = len(CAPTURE_MAGIC)
+
+    def _rotate(self):
+        self._file.close()
+        for index in range(self._backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{index}"):
+                os.replace(f"{self.path}.{index}", f"{self.path}.{index + 1}")
+        if self._backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._open()
+
+
+class CaptureReader:
+    """Iterates the records in a capture file without copying them.
+
+    The frames (telegrams sent, bytes received) are views into the memory-mapped file and are only valid
+    until the reader is closed; copy them with bytes() to keep them.
+
+        with CaptureReader("capture.bin") as capture:
+            for record in capture:
+                decoder.feed(record.frame)
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        if self._view[: len(CAPTURE_MAGIC)] != CAPTURE_MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a StecaGrid capture")
+
+    def __iter__(self):
+        view = self._view
+        pos = len(CAPTURE_MAGIC)
+        end = len(view)
+        while pos + _RECORD.size <= end:
+            when, direction, length = _RECORD.unpack_from(view, pos)
+            pos += _RECORD.size
+            if pos + length > end:
+                # Cut short, e.g. the writer was killed
+                break
+            yield CaptureRecord(when, _DIRECTIONS[direction], view[pos : pos + length])
+            pos += length
+
+    def close(self):
+        self._view.release()
+        try:
+            self._map.close()
+        except BufferError:
+            # Frames are still referenced, the map is closed with them
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def load_responses(path):
+    """Return the responses recorded for each request telegram, in order.
+
+    The received bytes are decoded like StecaBus does, invalid ones are
+    skipped. A response belongs to the oldest unanswered request to the same
+    inverter with the same identifier. Each response comes with the seconds it
+    took.
+    """
+    requests: dict[tuple[int, int], deque] = {}
+    responses: dict[bytes, deque] = {}
+    decoder = StecaFrameDecoder()
+    with CaptureReader(path) as capture:
+        for record in capture:
+            if record.direction == DIRECTION_TX:
+                frame = record.frame
+                if len(frame) > REQUEST_IDENTIFIER_POS:
+                    requests.setdefault(
+                        (frame[4], frame[REQUEST_IDENTIFIER_POS]), deque()
+                    ).append((record.time, bytes(frame)))
+                continue
+            decoder.feed(record.frame)
+            while (frame := decoder.next_frame()) is not None:
+                if len(frame) <= REQUEST_IDENTIFIER_POS:
+                    continue
+                if pending := requests.get((frame[5], frame[REQUEST_IDENTIFIER_POS])):
+                    sent, request = pending.popleft()
+                    responses.setdefault(request, deque()).append(
+                        (record.time - sent, frame)
+                    )
+    return responses
+
+
+class CaptureReplay:
+    """TCP server acting as the gateway recorded in a capture.
+
+    Requests are answered with the responses recorded for the same telegram,
+    in the recorded order and starting over when they run out. Requests that
+    were not answered in the capture get no answer. With timing the
+    recorded response times are kept.
+    """
+
+    def __init__(self, path, host="127.0.0.1", port=0, timing=False):
+        """Load the capture, port 0 picks a free port."""
+        self.responses = load_responses(path)
+        self.host = host
+        self.port = port
+        self.timing = timing
+        self.answered = 0
+        self._server: asyncio.Server | None = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    async def _handle(self, reader, writer):
+        decoder = StecaFrameDecoder()
+        try:
+            while data := await reader.read(1024):
+                decoder.feed(data)
+                while (request := decoder.next_frame()) is not None:
+                    recorded = self.responses.get(request)
+                    if not recorded:
+                        continue
+                    delay, response = recorded[0]
+                    recorded.rotate(-1)
+                    if self.timing:
+                        await asyncio.sleep(delay)
+                    writer.write(response)
+                    await writer.drain()
+                    self.answered += 1
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
@@ -1,15 +1,37 @@
 """Config flow for StecaGrid integration."""
 
+import asyncio
+import ipaddress
 import logging
 from typing import Any
 
 import voluptuous as vol
 
 from homeassistant import config_entries, core, exceptions
+from homeassistant.components import network
 from homeassistant.const import CONF_ALIAS
 from homeassistant.data_entry_flow import FlowResult
 
-from .const import CONF_INVERTER_HOST, CONF_INVERTER_POLL, CONF_INVERTER_PORT, DOMAIN
+from .const import (
+    CONF_HEARTBEAT,
+    CONF_HIGH_RATE,
+    CONF_INVERTER_ADDRESSES,
+    CONF_INVERTER_HOST,
+    CONF_INVERTER_POLL,
+    CONF_INVERTER_PORT,
+    CONF_PIPELINE,
+    DATA_BUSES,
+    DEFAULT_HEARTBEAT,
+    DEFAULT_INVERTER_ADDRESS,
+    DOMAIN,
+)
+from .steca import (
+    CONNECT_TIMEOUT,
+    SCAN_PORT,
+    StecaBus,
+    discover_inverters,
+    scan_gateways,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -18,8 +40,18 @@ STEP_DATA_SCHEMA = vol.Schema(
         vol.Required(CONF_INVERTER_HOST, default=None): str,
         vol.Required(CONF_INVERTER_PORT, default=23): int,
         vol.Optional(CONF_INVERTER_POLL, default=5): int,
+        vol.Optional(CONF_HEARTBEAT, default=DEFAULT_HEARTBEAT): int,
+        vol.Optional(CONF_HIGH_RATE, default=False): bool,
+        vol.Optional(CONF_PIPELINE, default=False): bool,
     }
 )
+CONF_GATEWAY = "gateway"
+GATEWAY_MANUAL = "manual"
+
+# Largest network scanned per adapter, larger ones are cut to the /24 around
+# the Home Assistant address
+SCAN_MIN_PREFIX = 24
+
 STEP_DATA_ALIAS = vol.Schema(
     {
         vol.Required(CONF_ALIAS): str,
@@ -34,13 +66,30 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
 
     CONNECTION_CLASS = config_entries.CONN_CLASS_LOCAL_POLL
 
+    def __init__(self):
+        """Initialize the flow."""
+        # Gateways found on the local network, None until scanned
+        self._gateways: dict[str, str] | None = None
+        # Inverter discovery running behind the progress step
+        self._discover_task: asyncio.Task | None = None
+
     async def async_step_user(self, user_input=None):
         """Handle the initial step."""
         errors = {}
+        if user_input is None and self._gateways is None:
+            self._gateways = await self._async_scan()
+            if self._gateways:
+                return await self.async_step_gateway()
+
         if user_input is not None:
             try:
-                self._userInput = user_input
-                return await self.async_step_alias()
+                if not await self._async_can_connect(
+                    user_input[CONF_INVERTER_HOST], user_input[CONF_INVERTER_PORT]
+                ):
+                    raise CannotConnect
+                return await self._async_step_inverters(user_input)
+            except CannotConnect:
+                errors["base"] = "cannot_connect"
             except Exception:  # pylint: disable=broad-except
                 _LOGGER.exception("Unexpected exception")
                 errors["base"] = "unknown"
@@ -49,6 +98,138 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             step_id="user", data_schema=STEP_DATA_SCHEMA, errors=errors
         )
 
+    async def async_step_gateway(self, user_input=None):
+        """Let the user pick one of the gateways found on the network."""
+        errors = {}
+        if user_input is not None:
+            gateway = user_input.pop(CONF_GATEWAY)
+            if gateway == GATEWAY_MANUAL:
+                return self.async_show_form(
+                    step_id="user", data_schema=STEP_DATA_SCHEMA
+                )
+            host, port = gateway.rsplit(":", 1)
+            try:
+                return await self._async_step_inverters(
+                    {
+                        CONF_INVERTER_HOST: host,
+                        CONF_INVERTER_PORT: int(port),
+                        **user_input,
+                    }
+                )
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Unexpected exception")
+                errors["base"] = "unknown"
+
+        schema = vol.Schema(
+            {
+                vol.Required(CONF_GATEWAY): vol.In(
+                    {**self._gateways, GATEWAY_MANUAL: "Enter address manually"}
+                ),
+                vol.Optional(CONF_INVERTER_POLL, default=5): int,
+                vol.Optional(CONF_HEARTBEAT, default=DEFAULT_HEARTBEAT): int,
+                vol.Optional(CONF_HIGH_RATE, default=False): bool,
+                vol.Optional(CONF_PIPELINE, default=False): bool,
+            }
+        )
+        return self.async_show_form(
+            step_id="gateway", data_schema=schema, errors=errors
+        )
+
+    async def _async_step_inverters(self, user_input):
+        """Find the inverters behind the chosen gateway, then ask for the alias."""
+        self._userInput = user_input
+        return await self.async_step_discover()
+
+    async def async_step_discover(self, user_input=None):
+        """Show progress while the inverters are probed, it takes a while."""
+        if self._discover_task is None:
+            self._discover_task = self.hass.async_create_task(
+                self._async_discover(
+                    self._userInput[CONF_INVERTER_HOST],
+                    self._userInput[CONF_INVERTER_PORT],
+                )
+            )
+        if not self._discover_task.done():
+            return self.async_show_progress(
+                step_id="discover",
+                progress_action="discover",
+                progress_task=self._discover_task,
+            )
+
+        try:
+            addresses = self._discover_task.result()
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception("Unexpected exception")
+            addresses = [DEFAULT_INVERTER_ADDRESS]
+        self._discover_task = None
+        self._userInput[CONF_INVERTER_ADDRESSES] = addresses
+        return self.async_show_progress_done(next_step_id="alias")
+
+    async def _async_scan(self):
+        """Return the gateways on the local networks as choices for the form."""
+        hosts = set()
+        for adapter in await network.async_get_adapters(self.hass):
+            if not adapter["enabled"]:
+                continue
+            for address in adapter["ipv4"]:
+                prefix = max(address["network_prefix"], SCAN_MIN_PREFIX)
+                interface = ipaddress.ip_interface(f"{address['address']}/{prefix}")
+                if interface.is_loopback or interface.is_link_local:
+                    continue
+                hosts.update(interface.network.hosts())
+                hosts.discard(interface.ip)
+
+        # Configured gateways are not offered again
+        configured = {
+            (entry.data[CONF_INVERTER_HOST], entry.data[CONF_INVERTER_PORT])
+            for entry in self._async_current_entries()
+        }
+        found = await scan_gateways(sorted(hosts))
+        _LOGGER.debug(f"Scanned {len(hosts)} hosts, found gateways {found}")
+        return {
+            f"{host}:{SCAN_PORT}": f"{host}:{SCAN_PORT}"
+            + ("" if answered else " (no inverter answered)")
+            for host, answered in sorted(found, key=lambda item: not item[1])
+            if (host, SCAN_PORT) not in configured
+        }
+
+    async def _async_can_connect(self, host, port):
+        """Return True if the gateway accepts a connection."""
+        if (host, port) in self.hass.data.get(DOMAIN, {}).get(DATA_BUSES, {}):
+            # Already connected for another entry
+            return True
+        try:
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(host, port), CONNECT_TIMEOUT
+            )
+        except (OSError, TimeoutError):
+            return False
+        writer.close()
+        return True
+
+    async def _async_discover(self, host, port):
+        """Find the inverters answering on the gateway's RS485 bus."""
+        # Reuse the bus of an entry already polling this gateway
+        bus = self.hass.data.get(DOMAIN, {}).get(DATA_BUSES, {}).get((host, port))
+        temporary_bus = bus is None
+        if temporary_bus:
+            bus = StecaBus(host, port)
+        try:
+            addresses = await discover_inverters(bus)
+        finally:
+            if temporary_bus:
+                await bus.close()
+
+        if not addresses:
+            # The inverters do not answer at night, assume the default address
+            _LOGGER.info(
+                f"No inverters found on {host}:{port}, using address {DEFAULT_INVERTER_ADDRESS}"
+            )
+            return [DEFAULT_INVERTER_ADDRESS]
+
+        _LOGGER.info(f"Found inverters {addresses} on {host}:{port}")
+        return addresses
+
     async def async_step_alias(
         self, user_input: dict[str, Any] | None = None
     ) -> FlowResult:
@@ -62,8 +243,12 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 _LOGGER.exception("Unexpected exception")
                 errors["base"] = "unknown"
             else:
+                addresses = self._userInput[CONF_INVERTER_ADDRESSES]
+                inverters = (
+                    f", {len(addresses)} inverters" if len(addresses) > 1 else ""
+                )
                 return self.async_create_entry(
-                    title=f"{self._userInput[CONF_ALIAS]}  ({self._userInput[CONF_INVERTER_HOST]}:{self._userInput[CONF_INVERTER_PORT]})",
+                    title=f"{self._userInput[CONF_ALIAS]}  ({self._userInput[CONF_INVERTER_HOST]}:{self._userInput[CONF_INVERTER_PORT]}{inverters})",
                     data=self._userInput,
                 )
 
@@ -6,4 +6,39 @@ WATT = "W"
 CONF_INVERTER_HOST = "inverter_host"
 CONF_INVERTER_PORT = "inverter_port"
 CONF_INVERTER_POLL = "scan_interval"
+CONF_INVERTER_ADDRESSES = "inverter_addresses"
+CONF_HEARTBEAT = "heartbeat"
+CONF_HIGH_RATE = "high_rate"
+CONF_PIPELINE = "pipeline"
 DEFAULT_INVERTER_POLLRATE = 5
+DEFAULT_INVERTER_ADDRESS = 1
+# Sensor states are only written when they change, and at least this often
+# (seconds)
+DEFAULT_HEARTBEAT = 300
+
+# In high-rate mode the AC power is read continuously, at most this often
+# (seconds), and published as a summary once per scan interval
+HIGH_RATE_INTERVAL = 0.1
+# Dispatcher signal with every AC power sample (value in W, monotonic time),
+# formatted with the alias of the inverter
+SIGNAL_AC_SAMPLE = "stecagrid_ac_sample_{}"
+
+# Service returning the recent values of a measurement from memory
+SERVICE_GET_RECENT = "get_recent"
+# Service switching the binary capture of the gateway traffic on and off, the
+# captures are written to <config>/stecagrid/<host>_<port>.cap
+SERVICE_CAPTURE = "capture"
+
+# Seconds an update cycle may take. Measurements not read by then keep
+# their previous value and are reported as stale.
+CYCLE_BUDGET = 3.0
+
+# hass.data[DOMAIN] key holding the shared gateway buses, keyed by (host, port)
+DATA_BUSES = "buses"
+# hass.data[DOMAIN] key of the scheduler polling all inverters
+DATA_FLEET = "fleet"
+
+# The inverter sleeps at night. It is then only probed, with the interval
+# doubling up to these limits (seconds).
+SLEEP_INTERVAL_MAX = 600
+SLEEP_INTERVAL_DAY_MAX = 60
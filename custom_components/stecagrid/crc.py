@@ -0,0 +1,117 @@
+"""CRC routines for the StecaGrid RS485 protocol."""
+
+CRC_8_OFFSET = 0x55
+CRC_16_OFFSET = 0x5555
+
+FRAME_HEADER_LENGTH = 7
+FRAME_END = 0x03
+
+# A list of 16 CRC-8 values
+CRC8_Table = [
+    0x00,
+    0x8F,
+    0x27,
+    0xA8,
+    0x4E,
+    0xC1,
+    0x69,
+    0xE6,
+    0x9C,
+    0x13,
+    0xBB,
+    0x34,
+    0xD2,
+    0x5D,
+    0xF5,
+    0x7A,
+]
+# A list of 16 CRC-16 values
+CRC16_Table = [
+    0x0000,
+    0xACAC,
+    0xEC05,
+    0x40A9,
+    0x6D57,
+    0xC1FB,
+    0x8152,
+    0x2DFE,
+    0xDAAE,
+    0x7602,
+    0x36AB,
+    0x9A07,
+    0xB7F9,
+    0x1B55,
+    0x5BFC,
+    0xF750,
+]
+
+
+def _byte_table(nibble_table):
+    """Expand a 16 entry nibble table into a 256 entry byte table.
+
+    The nibble algorithm processes the low byte of the CRC in two 4 bit steps.
+    Both steps are linear, so their combined effect on the low byte can be
+    tabulated once and the rest of the CRC is simply shifted down by 8 bits.
+    """
+    table = []
+    for value in range(256):
+        value = (value >> 4) ^ nibble_table[value & 0x0F]
+        value = (value >> 4) ^ nibble_table[value & 0x0F]
+        table.append(value)
+    return tuple(table)
+
+
+CRC8_BYTE_TABLE = _byte_table(CRC8_Table)
+CRC16_BYTE_TABLE = _byte_table(CRC16_Table)
+
+
+def crc8_block(currentCrc, data):
+    """Return the CRC-8 of data, continuing from currentCrc."""
+    table = CRC8_BYTE_TABLE
+    for value in data:
+        currentCrc = table[currentCrc ^ value]
+    return currentCrc
+
+
+def crc16_block(currentCrc, data):
+    """Return the CRC-16 of data, continuing from currentCrc."""
+    table = CRC16_BYTE_TABLE
+    for value in data:
+        currentCrc = (currentCrc >> 8) ^ table[(currentCrc ^ value) & 0xFF]
+    return currentCrc
+
+
+def header_crc_ok(frame):
+    """Check the CRC-8 that closes the 7 byte telegram header."""
+    return (
+        len(frame) >= FRAME_HEADER_LENGTH
+        and crc8_block(CRC_8_OFFSET, frame[: FRAME_HEADER_LENGTH - 1])
+        == frame[FRAME_HEADER_LENGTH - 1]
+    )
+
+
+def trailer_crc_ok(frame):
+    """Check the end byte and the CRC-16 in front of it.
+
+    The CRC-16 covers everything up to the CRC itself followed by the end
+    byte 0x03.
+    """
+    if len(frame) < FRAME_HEADER_LENGTH + 3 or frame[-1] != FRAME_END:
+        return False
+    table = CRC16_BYTE_TABLE
+    crc = crc16_block(CRC_16_OFFSET, frame[:-3])
+    crc = (crc >> 8) ^ table[(crc ^ FRAME_END) & 0xFF]
+    return crc == frame[-3] << 8 | frame[-2]
+
+
+def frame_crc_ok(frame):
+    """Check both CRCs of a complete telegram."""
+    return header_crc_ok(frame) and trailer_crc_ok(frame)
+
+
+def verify_frames(frames):
+    """Check many telegrams at once, e.g. from a capture.
+
+    Returns a list with one bool per telegram.
+    """
+    return [frame_crc_ok(memoryview(frame)) for frame in frames]
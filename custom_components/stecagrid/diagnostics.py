@@ -0,0 +1,37 @@
+"""Diagnostics support for StecaGrid."""
+
+from typing import Any
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    stecagrid = hass.data[DOMAIN][entry.entry_id]
+
+    return {
+        "entry": dict(entry.data),
+        "inverters": [
+            {
+                "alias": coordinator._alias,
+                "address": coordinator.stecaApi.address,
+                "asleep": coordinator.stecaApi.asleep,
+                "update_interval": coordinator.poll_interval.total_seconds(),
+                "data": coordinator.data,
+                "stats": coordinator.stecaApi.stats.as_dict(),
+                "capture": coordinator.stecaApi._bus.capture.path
+                if coordinator.stecaApi._bus.capture is not None
+                else None,
+                "gateway": {
+                    "pipeline": coordinator.stecaApi._bus.pipeline,
+                    "circuit_breaker": coordinator.stecaApi._bus.breaker.as_dict(),
+                },
+            }
+            for coordinator in stecagrid._coordinators
+        ],
+    }
@@ -0,0 +1,75 @@
+"""Lifetime energy counter of a StecaGrid inverter.
+
+The inverter only reports the yield of the current day. The counter
+integrates the AC power samples of the regular poll cycles (trapezoidal rule)
+and is pulled up to the last day boundary plus the daily yield whenever that
+is read, so it is as fine grained as the power readings and does not drift.
+The counter never decreases: when the integration ran ahead of the inverter,
+the difference is kept. A daily yield below the previous one is only taken as
+a new day when the day changed or the inverter slept since; otherwise it is a
+bad read and ignored.
+"""
+
+# Samples further apart than this (seconds) are not integrated, the energy
+# of the gap is filled in by the next daily yield
+ENERGY_MAX_GAP = 60.0
+
+
+class EnergyIntegrator:
+    """Cumulative energy in Wh from power samples and daily yields."""
+
+    def __init__(
+        self,
+        total=0.0,
+        base=None,
+        last_yield=None,
+        day=None,
+        max_gap=ENERGY_MAX_GAP,
+    ):
+        self.total = total
+        # Counter value at the last reset of the daily yield
+        self.base = base
+        self.last_yield = last_yield
+        # Day of last_yield, None after the inverter slept
+        self.day = day
+        self.max_gap = max_gap
+        self._power = None
+        self._time = None
+
+    def add_power(self, power, now):
+        """Add a power sample in W taken at monotonic time now (seconds)."""
+        if self._time is not None:
+            elapsed = now - self._time
+            if 0 < elapsed <= self.max_gap:
+                self.total += (self._power + power) / 2 * elapsed / 3600
+        self._power = power
+        self._time = now
+
+    def add_gap(self):
+        """Forget the last sample, e.g. when the power was not read."""
+        self._power = None
+        self._time = None
+
+    def add_sleep(self):
+        """The inverter slept, its daily yield may have been reset."""
+        self.add_gap()
+        self.day = None
+
+    def add_daily_yield(self, energy, day):
+        """Re-anchor the counter to the yield of day in Wh.
+
+        day is any value identifying the production day, e.g. the local date.
+        """
+        if self.base is None:
+            # First reading, the counter starts with the day's yield
+            self.base = max(0.0, self.total - energy)
+        elif self.last_yield is not None and energy < self.last_yield:
+            if day == self.day:
+                # Same day, the inverter cannot have reset
+                return
+            # The inverter started a new day. What was integrated since the
+            # reset belongs to the new day already.
+            self.base = max(self.base + self.last_yield, self.total - energy)
+        self.last_yield = energy
+        self.day = day
+        self.total = max(self.total, self.base + energy)
@@ -0,0 +1,136 @@
+"""Poll scheduler for many StecaGrid inverters in one event loop.
+
+Instead of one timer per inverter, a StecaFleet keeps the next poll time of
+every member in a heap and runs a single task that starts the polls when they
+are due. The first poll of each member is placed at a phase of its interval
+taken from a low-discrepancy sequence, so members added over time stay evenly
+spread without moving the ones already scheduled, and a fleet of inverters
+with the same interval polls at a steady rate instead of in bursts. A
+semaphore bounds the polls in flight, so no more than that many gateway
+connections are busy (or being opened) at once. Members behind one gateway
+are expected to share its StecaBus, so they also share its connection.
+
+Members keep their cadence: a poll that overran its interval skips the polls
+it missed instead of running them back-to-back.
+"""
+
+import asyncio
+import heapq
+from itertools import count
+from logging import getLogger
+
+_LOGGER = getLogger(__name__)
+
+# Polls in flight at once
+FLEET_CONCURRENCY = 32
+# Fractional part of the golden ratio, spreads the phases of the members
+PHASE_STEP = 0.6180339887498949
+
+
+class StecaFleet:
+    """Runs the polls of all members from one task.
+
+    A member is a key, an async poll function and its interval in seconds.
+    The poll function returns the interval until its next poll, or None to
+    keep the current one.
+    """
+
+    def __init__(self, concurrency=FLEET_CONCURRENCY):
+        self._semaphore = asyncio.Semaphore(concurrency)
+        # key -> (poll, interval, generation)
+        self._members = {}
+        self._schedule = []
+        self._generation = count()
+        self._phases = count()
+        self._polls: set[asyncio.Task] = set()
+        self._task = None
+        self._changed = asyncio.Event()
+
+    def __len__(self):
+        return len(self._members)
+
+    def add(self, key, poll, interval):
+        """Schedule a member, its first poll is within one interval."""
+        loop = asyncio.get_running_loop()
+        phase = next(self._phases) * PHASE_STEP % 1
+        generation = next(self._generation)
+        self._members[key] = (poll, interval, generation)
+        heapq.heappush(
+            self._schedule, (loop.time() + phase * interval, generation, key)
+        )
+        self._changed.set()
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._async_run())
+
+    def remove(self, key):
+        """Stop polling a member, a poll in progress is not interrupted."""
+        # Its entries in the schedule are skipped from now on
+        self._members.pop(key, None)
+        self._changed.set()
+
+    async def close(self):
+        """Stop all polls."""
+        self._members.clear()
+        tasks = [*self._polls, *([self._task] if self._task else [])]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+
+    async def _async_run(self):
+        """Start the polls that are due until the fleet is empty."""
+        loop = asyncio.get_running_loop()
+        while self._members:
+            if not self._schedule:
+                # All members are being polled
+                self._changed.clear()
+                await self._changed.wait()
+                continue
+            due, generation, key = self._schedule[0]
+            member = self._members.get(key)
+            if member is None or member[2] != generation:
+                # Removed, or scheduled again since
+                heapq.heappop(self._schedule)
+                continue
+
+            delay = due - loop.time()
+            if delay > 0:
+                self._changed.clear()
+                try:
+                    async with asyncio.timeout(delay):
+                        await self._changed.wait()
+                except TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._schedule)
+            poll = loop.create_task(self._async_poll(key, due, generation))
+            self._polls.add(poll)
+            poll.add_done_callback(self._polls.discard)
+
+    async def _async_poll(self, key, due, generation):
+        """Poll one member and schedule its next poll."""
+        loop = asyncio.get_running_loop()
+        member = self._members.get(key)
+        if member is None:
+            # Removed before the poll started
+            return
+        poll, interval, _ = member
+        async with self._semaphore:
+            try:
+                interval = await poll() or interval
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception(f"Polling {key} failed")
+
+        member = self._members.get(key)
+        if member is None or member[2] != generation:
+            return
+        # Keep the phase, skipping the polls that were missed
+        now = loop.time()
+        due += interval
+        if due < now:
+            due += interval * -(-(now - due) // interval)
+        generation = next(self._generation)
+        self._members[key] = (poll, interval, generation)
+        heapq.heappush(self._schedule, (due, generation, key))
+        self._changed.set()
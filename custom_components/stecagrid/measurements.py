@@ -0,0 +1,140 @@
+"""Measurements read from StecaGrid inverters.
+
+Every measurement the integration reads is one row in MEASUREMENTS. The
+connector decodes responses from it, the coordinator builds its polling
+schedule from it and the sensor platform creates one entity per row. Sensor
+metadata is kept as plain strings.
+"""
+
+from dataclasses import dataclass
+
+# Value decoders, see StecaConnector.GetMeasurement
+DECODE_FLOAT = "float"
+DECODE_TIME = "time"
+
+# Position of the value record in measurement responses
+VALUE_RECORD_OFFSET = 22
+
+
+@dataclass(frozen=True)
+class Measurement:
+    """One value read from the inverter."""
+
+    key: str
+    identifier: int
+    # Formula byte in front of the value, None for values that are not floats
+    formula: int | None
+    unit: str | None
+    # Position of the first value record in the response and the number of
+    # records; floats are a single record
+    offset: int = VALUE_RECORD_OFFSET
+    records: int = 1
+    # Responses without the value (no production) are reported as the
+    # minimum, values outside the bounds are rejected as invalid
+    minimum: float | None = None
+    maximum: float | None = None
+    precision: int = 3
+    # Seconds between reads. Values below the configured scan interval are
+    # read every cycle, None is read once at startup.
+    poll_interval: float | None = 0
+    # Reported as zero while the inverter is asleep
+    zero_when_asleep: bool = False
+    decoder: str = DECODE_FLOAT
+    # Sensor metadata
+    name: str = ""
+    icon: str | None = None
+    device_class: str | None = None
+
+
+MEASUREMENTS: tuple[Measurement, ...] = (
+    Measurement(
+        key="ac_power",
+        identifier=41,
+        formula=0x0B,
+        unit="W",
+        minimum=0.0,
+        maximum=10000.0,
+        precision=1,
+        poll_interval=0,
+        zero_when_asleep=True,
+        name="Output AC power",
+        icon="mdi:solar-power",
+        device_class="power",
+    ),
+    Measurement(
+        key="panel_power",
+        identifier=34,
+        formula=0x0B,
+        unit="W",
+        minimum=0.0,
+        maximum=12000.0,
+        poll_interval=15,
+        zero_when_asleep=True,
+        name="Output Panel power",
+        icon="mdi:solar-power",
+        device_class="power",
+    ),
+    Measurement(
+        key="panel_voltage",
+        identifier=35,
+        formula=0x05,
+        unit="V",
+        minimum=0.0,
+        maximum=1000.0,
+        poll_interval=15,
+        zero_when_asleep=True,
+        name="Panel voltage",
+        icon="mdi:flash",
+        device_class="voltage",
+    ),
+    Measurement(
+        key="panel_current",
+        identifier=36,
+        formula=0x07,
+        unit="A",
+        minimum=0.0,
+        maximum=50.0,
+        poll_interval=15,
+        zero_when_asleep=True,
+        name="Panel current",
+        icon="mdi:current-ac",
+        device_class="current",
+    ),
+    Measurement(
+        key="nominal_power",
+        identifier=29,
+        formula=0x0B,
+        unit="W",
+        poll_interval=None,
+        name="Nominal power",
+        icon="mdi:solar-power",
+        device_class="power",
+    ),
+    Measurement(
+        key="daily_yield",
+        identifier=60,
+        formula=0x09,
+        unit="Wh",
+        minimum=0.0,
+        precision=1,
+        poll_interval=60,
+        name="Output today",
+        icon="mdi:solar-power",
+        device_class="energy",
+    ),
+    Measurement(
+        key="time",
+        identifier=4,
+        formula=None,
+        unit=None,
+        # year, month, day, hour, minute, second
+        offset=12,
+        records=6,
+        poll_interval=600,
+        decoder=DECODE_TIME,
+        name="timestamp",
+        icon="mdi:clock-digital",
+    ),
+)
+
+MEASUREMENTS_BY_KEY = {measurement.key: measurement for measurement in MEASUREMENTS}
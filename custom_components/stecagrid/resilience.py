@@ -0,0 +1,106 @@
+"""Retry and circuit breaker policy for StecaGrid gateways.
+
+Reads are idempotent, so a failed request is retried a few times with a
+jittered, exponentially growing delay. A gateway that cannot be reached at
+all is cut off by a circuit breaker: after a number of failed connection
+attempts in a row requests fail right away, until a single probe request is
+let through after the reset timeout. While the gateway stays down the reset
+timeout doubles, so a dead host costs next to no sockets or event loop time.
+"""
+
+import random
+import time
+
+# Retries of a failed read and the delay before them (seconds)
+RETRY_ATTEMPTS = 2
+RETRY_BACKOFF_BASE = 0.1
+RETRY_BACKOFF_MAX = 1.0
+
+# Failed connection attempts in a row before the circuit opens, and the time
+# before a probe is let through (seconds, doubling up to the maximum)
+BREAKER_FAILURES = 3
+BREAKER_RESET = 30.0
+BREAKER_RESET_MAX = 600.0
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+def backoff_delay(attempt, base=RETRY_BACKOFF_BASE, maximum=RETRY_BACKOFF_MAX):
+    """Return the delay before retry number attempt (0 for the first).
+
+    The delay doubles with every attempt and is drawn from the upper half of
+    that range, so connectors failing together do not retry in lockstep.
+    """
+    delay = min(maximum, base * 2**attempt)
+    return random.uniform(delay / 2, delay)
+
+
+class CircuitBreaker:
+    """Circuit breaker for the connection to one gateway."""
+
+    def __init__(
+        self,
+        failures=BREAKER_FAILURES,
+        reset=BREAKER_RESET,
+        reset_max=BREAKER_RESET_MAX,
+    ):
+        self._threshold = failures
+        self._reset_base = reset
+        self._reset_max = reset_max
+        self.reset = reset
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.rejected = 0
+
+    def allow(self):
+        """Return True if a request may go to the gateway.
+
+        Once the reset timeout passed, one request is let through as probe,
+        the others are rejected until it succeeded or failed.
+        """
+        if self.state == STATE_CLOSED:
+            return True
+        now = time.monotonic()
+        # A probe that never completed is replaced after the reset timeout
+        if now >= self.opened_at + self.reset:
+            self.state = STATE_HALF_OPEN
+            self.opened_at = now
+            return True
+        self.rejected += 1
+        return False
+
+    def retry_in(self):
+        """Return the seconds until a probe is let through, 0 if closed."""
+        if self.state == STATE_CLOSED:
+            return 0.0
+        return max(0.0, self.opened_at + self.reset - time.monotonic())
+
+    def record_success(self):
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self.reset = self._reset_base
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == STATE_HALF_OPEN:
+            # The probe failed, wait longer before the next one
+            self.reset = min(self.reset * 2, self._reset_max)
+            self._open()
+        elif self.state == STATE_CLOSED and self.failures >= self._threshold:
+            self._open()
+
+    def _open(self):
+        self.state = STATE_OPEN
+        self.opened_at = time.monotonic()
+
+    def as_dict(self):
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "reset": self.reset,
+            "retry_in": round(self.retry_in(), 1),
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,91 @@
+"""Parser for the value records in StecaGrid responses.
+
+A response carries its data behind the header, service code, response code
+and a 2 byte data length:
+
+    header (7) | service | response code | length (2) | data | data CRC | CRC16 (2) | 0x03
+
+Values in the data are records of a formula byte followed by 3 value bytes.
+StecaResponse walks the records once, from a known start position, so a value
+byte that happens to equal a formula code is never mistaken for one.
+"""
+
+import struct
+
+RESPONSE_CODE_POS = 8
+# Data CRC, CRC16 and end byte behind the data
+DATA_TRAILER_LENGTH = 4
+RECORD_LENGTH = 4
+
+FORMULA_NOT_AVAILABLE = 0x00
+
+_FLOAT = struct.Struct(">f")
+
+
+def value_to_float(b0, b1, b2):
+    """Convert the 3 value bytes of a record to float.
+
+    The bytes hold the upper 25 bits of an IEEE 754 single precision float.
+    """
+    return _FLOAT.unpack((((b2 << 8 | b0) << 8 | b1) << 7).to_bytes(4, "big"))[0]
+
+
+def float_to_record(formula, value):
+    """Encode a non-negative value as a record, the inverse of value_to_float."""
+    bits = int.from_bytes(_FLOAT.pack(value), "big") >> 7
+    return bytes([formula, (bits >> 8) & 0xFF, bits & 0xFF, (bits >> 16) & 0xFF])
+
+
+class StecaResponse:
+    """Index of the value records in one response."""
+
+    __slots__ = ("frame", "positions", "formulas", "values")
+
+    def __init__(self, frame, offset, count=None):
+        """Walk the records starting at offset, at most count of them."""
+        self.frame = frame
+        # Record positions in order, first position of each formula and the
+        # decoded value at each position (None if not available)
+        self.positions: list[int] = []
+        self.formulas: dict[int, int] = {}
+        self.values: dict[int, float | None] = {}
+
+        end = len(frame) - DATA_TRAILER_LENGTH
+        if count is not None:
+            end = min(end, offset + count * RECORD_LENGTH)
+        for pos in range(offset, end - RECORD_LENGTH + 1, RECORD_LENGTH):
+            formula = frame[pos]
+            self.positions.append(pos)
+            self.formulas.setdefault(formula, pos)
+            self.values[pos] = (
+                None
+                if formula == FORMULA_NOT_AVAILABLE
+                else value_to_float(frame[pos + 1], frame[pos + 2], frame[pos + 3])
+            )
+
+    @property
+    def response_code(self):
+        return self.frame[RESPONSE_CODE_POS]
+
+    def __len__(self):
+        return len(self.positions)
+
+    def formula_at(self, index):
+        """Return the formula byte of the index'th record."""
+        return self.frame[self.positions[index]]
+
+    def value_at(self, index):
+        """Return the value of the index'th record."""
+        return self.values[self.positions[index]]
+
+    def int_at(self, index):
+        """Return the first 2 value bytes of the index'th record as signed int."""
+        pos = self.positions[index] + 1
+        return int.from_bytes(self.frame[pos : pos + 2], "big", signed=True)
+
+    def value(self, formula):
+        """Return the value of the first record with formula.
+
+        Raises KeyError if no record has that formula.
+        """
+        return self.values[self.formulas[formula]]
@@ -0,0 +1,90 @@
+"""Samples of StecaGrid measurements kept in memory.
+
+Samples are kept in a fixed-size ring of two arrays (time and value), so the
+memory used is the same at any sample rate. Rings are used for two things:
+
+- the high-rate AC power samples, which the coordinator drains into a summary
+  once per cycle, the raw samples only go to dispatcher subscribers
+- the recent history of every measurement, queried with downsample() by the
+  stecagrid.get_recent service instead of the recorder
+"""
+
+from array import array
+
+# Samples kept per ring
+SAMPLE_RING_SIZE = 1024
+# Samples kept per measurement in the recent history, an hour at the default
+# scan interval
+RECENT_SIZE = 720
+
+
+class SampleRing:
+    """The last `size` samples of a value, with their times (seconds)."""
+
+    def __init__(self, size=SAMPLE_RING_SIZE):
+        self._times = array("d", bytes(8 * size))
+        self._values = array("d", bytes(8 * size))
+        self._size = size
+        self._next = 0
+        self.count = 0
+        # Samples added since the last drain
+        self._pending = 0
+
+    def add(self, value, now):
+        self._times[self._next] = now
+        self._values[self._next] = value
+        self._next = (self._next + 1) % self._size
+        self.count += 1
+        self._pending += 1
+
+    def samples(self, count=None):
+        """Return the last count samples (all kept) as (time, value), oldest first."""
+        kept = min(self.count, self._size)
+        count = kept if count is None else min(count, kept)
+        start = self._next - count
+        return [
+            (self._times[index], self._values[index])
+            for index in range(start, self._next)
+        ]
+
+    def drain(self):
+        """Return min, max, mean and last of the samples since the last drain.
+
+        Returns None if there were none. Samples overwritten in between are
+        lost, so the ring must hold a cycle worth of them.
+        """
+        pending = min(self._pending, self._size)
+        if not pending:
+            return None
+        self._pending = 0
+        values = [value for _, value in self.samples(pending)]
+        return {
+            "min": min(values),
+            "max": max(values),
+            "mean": sum(values) / len(values),
+            "last": values[-1],
+            "samples": len(values),
+        }
+
+
+def downsample(samples, start, end, points):
+    """Return the samples between start and end in at most `points` buckets.
+
+    Each bucket of equal length that holds samples is returned as a dict of
+    the bucket start and the min, max and mean of its samples.
+    """
+    width = (end - start) / points
+    buckets = {}
+    for when, value in samples:
+        if start <= when < end:
+            index = min(int((when - start) / width), points - 1)
+            buckets.setdefault(index, []).append(value)
+    return [
+        {
+            "start": start + index * width,
+            "min": min(values),
+            "max": max(values),
+            "mean": sum(values) / len(values),
+        }
+        for index, values in sorted(buckets.items())
+    ]
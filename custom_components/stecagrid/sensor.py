@@ -1,21 +1,34 @@
 """Platform for Stecagrid sensor integration."""
 
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass
 from datetime import timedelta
 import logging
+import math
+import time
 
 from homeassistant.components.sensor import (
     SensorDeviceClass,
     SensorEntity,
     SensorEntityDescription,
+    SensorStateClass,
 )
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import UnitOfElectricCurrent, UnitOfEnergy, UnitOfPower, UnitOfElectricPotential
+from homeassistant.const import (
+    PERCENTAGE,
+    EntityCategory,
+    UnitOfEnergy,
+    UnitOfPower,
+    UnitOfTime,
+)
 from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.restore_state import ExtraStoredData, RestoreEntity
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
+from homeassistant.util import dt as dt_util
 
 from . import StecaGridCoordinator
 from .const import DEFAULT_INVERTER_POLLRATE, DOMAIN
+from .energy import ENERGY_MAX_GAP, EnergyIntegrator
+from .measurements import MEASUREMENTS
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -35,6 +48,10 @@ class StecaGridEntityDescription(SensorEntityDescription):
         native_unit_of_measurement,
         value,
         format=None,
+        entity_category=None,
+        entity_registry_enabled_default=True,
+        attributes=None,
+        data_key=None,
     ):
         super().__init__(key)
         self.key = key
@@ -43,8 +60,15 @@ class StecaGridEntityDescription(SensorEntityDescription):
         if device_class is not None:
             self.device_class = device_class
         self.native_unit_of_measurement = native_unit_of_measurement
-        self.value = value
         self.format = format
+        self.entity_category = entity_category
+        self.entity_registry_enabled_default = entity_registry_enabled_default
+        # Extract the state and the attributes (None for no attributes) from
+        # the coordinator
+        self.value = value
+        self.attributes = attributes
+        # Key of the value in the coordinator data
+        self.data_key = data_key or key
 
 
 async def async_setup_entry(
@@ -53,10 +77,14 @@ async def async_setup_entry(
     """Set up the sensor platform."""
     stecagrid = hass.data[DOMAIN][config.entry_id]
 
-    entities: list[StecagridSensor] = [
-        StecagridSensor(stecagrid._coordinator, sensor, stecagrid)
+    entities: list[SensorEntity] = [
+        StecagridSensor(coordinator, sensor, stecagrid)
+        for coordinator in stecagrid._coordinators
         for sensor in SENSORS_INVERTER
     ]
+    entities.extend(
+        StecagridEnergySensor(coordinator) for coordinator in stecagrid._coordinators
+    )
 
     async_add_entities(entities)
 
@@ -84,6 +112,10 @@ class StecagridSensor(CoordinatorEntity, SensorEntity):
 
         _LOGGER.info(self._attr_unique_id)
         self._attr_native_value = None  # Initialize the native value
+        self._attributes = None
+        # Monotonic time and availability of the last state write
+        self._last_write = -math.inf
+        self._written_available = None
 
     @property
     def device_info(self):
@@ -120,70 +152,171 @@ class StecagridSensor(CoordinatorEntity, SensorEntity):
     @callback
     def _handle_coordinator_update(self) -> None:
         """Handle updated data from the coordinator."""
-        data_available = False
-
+        description = self.entity_description
+        data = self.coordinator.data or {}
         try:
-            # Handle AC power
-            if "output" in self.entity_description.key:
-                self._attr_native_value = self.coordinator.data["ac_power"]
-                data_available = True
-            # Handle AC power
-            if "ac_power" in self.entity_description.key:
-                self._attr_native_value = self.coordinator.data["ac_power"]
-                data_available = True
-
-            # Handle panel power
-            if "panel_power" in self.entity_description.key:
-                self._attr_native_value = self.coordinator.data["panel_power"]
-                data_available = True
-
-            # Handle panel voltage
-            if "panel_voltage" in self.entity_description.key:
-                self._attr_native_value = self.coordinator.data["panel_voltage"]
-                data_available = True
-
-            # Handle panel current
-            if "panel_current" in self.entity_description.key:
-                self._attr_native_value = self.coordinator.data["panel_current"]
-                data_available = True
-
-            # Handle daily yield
-            if "daily_yield" in self.entity_description.key:
-                self._attr_native_value = self.coordinator.data["daily_yield"]
-                data_available = True
-
-            # Handle time
-            if "time" in self.entity_description.key:
-                self._attr_native_value = self.coordinator.data["time"]
-                data_available = True
-
-            self._attr_available = data_available
-
-            # Only call async_write_ha_state if the state has changed
-            if data_available:
-                self.async_write_ha_state()
-
-        except KeyError as ex:
-            _LOGGER.debug(
-                f"KeyError: {str(ex)} while handling {self.entity_description.key}"
+            value = description.value(self.coordinator, description.data_key)
+            attributes = (
+                description.attributes(self.coordinator)
+                if description.attributes is not None
+                else None
             )
-        except ValueError as ex:
-            _LOGGER.debug(
-                f"ValueError: {str(ex)} while handling {self.entity_description.key}"
+        except (KeyError, TypeError) as ex:
+            # No data yet
+            _LOGGER.debug(f"{ex!r} while handling {description.key}")
+            return
+
+        # Values the inverter did not answer this cycle carry their age
+        age = data.get("stale", {}).get(description.data_key)
+        if age is not None:
+            attributes = {**(attributes or {}), "age": age}
+
+        # Only write when something changed, or as a heartbeat
+        now = time.monotonic()
+        available = self.available
+        if (
+            value == self._attr_native_value
+            and attributes == self._attributes
+            and available == self._written_available
+            and now - self._last_write < self.coordinator.heartbeat
+        ):
+            return
+
+        self._attr_native_value = value
+        self._attributes = attributes
+        self._written_available = available
+        self._last_write = now
+        self.async_write_ha_state()
+
+    @property
+    def extra_state_attributes(self):
+        return self._attributes
+
+
+@dataclass
+class StecagridEnergyData(ExtraStoredData):
+    """State of the energy counter kept across restarts."""
+
+    total: float
+    base: float | None
+    last_yield: float | None
+    day: str | None = None
+
+    def as_dict(self):
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, restored):
+        try:
+            return cls(
+                restored["total"],
+                restored["base"],
+                restored["last_yield"],
+                restored.get("day"),
             )
-        except Exception as ex:
-            _LOGGER.debug(
-                f"Unexpected error: {str(ex)} while handling {self.entity_description.key}"
+        except KeyError:
+            return None
+
+
+class StecagridEnergySensor(CoordinatorEntity, RestoreEntity, SensorEntity):
+    """Lifetime energy, integrated from the AC power and the daily yield."""
+
+    _attr_device_class = SensorDeviceClass.ENERGY
+    _attr_state_class = SensorStateClass.TOTAL_INCREASING
+    _attr_native_unit_of_measurement = UnitOfEnergy.WATT_HOUR
+    _attr_suggested_display_precision = 0
+    _attr_icon = "mdi:solar-power"
+
+    def __init__(self, coordinator: StecaGridCoordinator):
+        """Initialize the sensor."""
+        super().__init__(coordinator)
+        self._attr_unique_id = f"{coordinator._alias}_lifetime_energy"
+        self._attr_name = f"{coordinator._alias} Lifetime energy"
+        self._attr_device_info = {"identifiers": {(DOMAIN, coordinator._alias)}}
+        # Samples further apart than a few cycles are a gap
+        self._energy = EnergyIntegrator(
+            max_gap=max(
+                ENERGY_MAX_GAP, 3 * coordinator._pollinterval.total_seconds()
             )
+        )
+        self._last_write = -math.inf
+
+    async def async_added_to_hass(self):
+        """Restore the counter and follow the coordinator."""
+        if (restored := await self.async_get_last_extra_data()) is not None and (
+            data := StecagridEnergyData.from_dict(restored.as_dict())
+        ) is not None:
+            self._energy.total = data.total
+            self._energy.base = data.base
+            self._energy.last_yield = data.last_yield
+            self._energy.day = data.day
+            self._attr_native_value = round(data.total, 1)
+        await super().async_added_to_hass()
+        self._handle_coordinator_update()
 
     @property
-    def extra_state_attributes(self):
-        if "time" in self.entity_description.key:
-            attributes = {}
-            attributes["Status"] = self.coordinator.stecaApi.timestamp_status
-            return attributes
+    def extra_restore_state_data(self):
+        return StecagridEnergyData(
+            self._energy.total,
+            self._energy.base,
+            self._energy.last_yield,
+            self._energy.day,
+        )
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Integrate the power of the cycle."""
+        data = self.coordinator.data
+        if not data:
+            return
+        stale = data.get("stale", {})
+        if self.coordinator.stecaApi.asleep:
+            self._energy.add_sleep()
+        elif "ac_power" not in data or "ac_power" in stale:
+            self._energy.add_gap()
         else:
-            None
+            self._energy.add_power(data["ac_power"], time.monotonic())
+        if "daily_yield" in data and "daily_yield" not in stale:
+            self._energy.add_daily_yield(
+                data["daily_yield"], dt_util.now().date().isoformat()
+            )
+
+        value = round(self._energy.total, 1)
+        now = time.monotonic()
+        if (
+            value == self._attr_native_value
+            and now - self._last_write < self.coordinator.heartbeat
+        ):
+            return
+        self._attr_native_value = value
+        self._last_write = now
+        self.async_write_ha_state()
+
+
+def _time_attributes(coordinator):
+    return {"Status": coordinator.stecaApi.timestamp_status}
+
+
+def _sample_attributes(coordinator):
+    # Summary of the high-rate samples, the state is their mean
+    return coordinator.data.get("ac_power_samples")
+
+
+# State attributes of the measurement sensors, by measurement key
+MEASUREMENT_ATTRIBUTES = {"time": _time_attributes, "ac_power": _sample_attributes}
+
+
+def _value(coordinator, key):
+    return coordinator.data[key]
+
+
+def _cycle_duration(coordinator, key):
+    # Poll statistics are not part of the data, they change every cycle
+    return round(coordinator.stecaApi.stats.cycles.last() * 1000)
+
+
+def _success_rate(coordinator, key):
+    return coordinator.stecaApi.stats.success_rate()
 
 
 SENSORS_INVERTER: tuple[SensorEntityDescription, ...] = (
@@ -193,54 +326,44 @@ SENSORS_INVERTER: tuple[SensorEntityDescription, ...] = (
         icon="mdi:solar-power",
         device_class=SensorDeviceClass.POWER,
         native_unit_of_measurement=UnitOfPower.WATT,
-        value=lambda data, key: data[key],
-    ),
-    StecaGridEntityDescription(
-        key="ac_power",
-        name="Output AC power",
-        icon="mdi:solar-power",
-        device_class=SensorDeviceClass.POWER,
-        native_unit_of_measurement=UnitOfPower.WATT,
-        value=lambda data, key: data[key],
+        value=_value,
+        attributes=_sample_attributes,
+        data_key="ac_power",
     ),
-    StecaGridEntityDescription(
-        key="panel_power",
-        name="Output Panel power",
-        icon="mdi:solar-power",
-        device_class=SensorDeviceClass.POWER,
-        native_unit_of_measurement=UnitOfPower.WATT,
-        value=lambda data, key: data[key],
-    ),
-    StecaGridEntityDescription(
-        key="panel_voltage",
-        name="Panel voltage",
-        icon="mdi:flash",
-        device_class=SensorDeviceClass.VOLTAGE,
-        native_unit_of_measurement=UnitOfElectricPotential.VOLT,
-        value=lambda data, key: data[key],
+    # One sensor per measurement read from the inverter
+    *(
+        StecaGridEntityDescription(
+            key=measurement.key,
+            name=measurement.name,
+            icon=measurement.icon,
+            device_class=SensorDeviceClass(measurement.device_class)
+            if measurement.device_class
+            else None,
+            native_unit_of_measurement=measurement.unit,
+            value=_value,
+            attributes=MEASUREMENT_ATTRIBUTES.get(measurement.key),
+        )
+        for measurement in MEASUREMENTS
     ),
+    # Diagnostics, disabled by default
     StecaGridEntityDescription(
-        key="panel_current",
-        name="Panel current",
-        icon="mdi:current-ac",
-        device_class=SensorDeviceClass.CURRENT,
-        native_unit_of_measurement=UnitOfElectricCurrent.AMPERE,
-        value=lambda data, key: data[key],
-    ),
-    StecaGridEntityDescription(
-        key="daily_yield",
-        name="Output today",
-        icon="mdi:solar-power",
-        device_class=SensorDeviceClass.ENERGY,
-        native_unit_of_measurement=UnitOfEnergy.WATT_HOUR,
-        value=lambda data, key: data[key],
+        key="cycle_duration",
+        name="Poll cycle duration",
+        icon="mdi:timer-outline",
+        device_class=SensorDeviceClass.DURATION,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        value=_cycle_duration,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
     ),
     StecaGridEntityDescription(
-        key="time",
-        name="timestamp",
-        icon="mdi:clock-digital",
+        key="success_rate",
+        name="Poll success rate",
+        icon="mdi:check-network-outline",
         device_class=None,
-        native_unit_of_measurement=None,
-        value=lambda data, key: data[key],
+        native_unit_of_measurement=PERCENTAGE,
+        value=_success_rate,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
     ),
 )
@@ -0,0 +1,265 @@
+"""StecaGrid inverter simulator.
+
+Serves the StecaGrid RS485 protocol over TCP like a LAN-to-RS485 gateway with
+one or more inverters behind it, for tests and load runs without hardware:
+
+    async with StecaSimulator([SimulatedInverter(1), SimulatedInverter(2)]) as sim:
+        connector = StecaConnector(sim.host, sim.port, address=2)
+        await connector.GetACOutput()
+
+Faults seen on real gateways can be injected: latency and jitter, replies
+split over several TCP segments, truncated replies, replies concatenated with
+stray bytes, corrupted CRCs, "Service Not Supported" replies and inverters
+that are silent at night.
+"""
+
+import asyncio
+from datetime import datetime
+import random
+import struct
+
+from .crc import CRC_8_OFFSET, CRC_16_OFFSET, crc8_block, crc16_block
+from .measurements import DECODE_TIME, MEASUREMENTS
+from .response import FORMULA_NOT_AVAILABLE, RECORD_LENGTH, float_to_record
+from .steca import FRAME_START, SenderAddress, StecaFrameDecoder
+
+# Position of the data, and so the identifier, in a telegram
+DATA_START = 11
+
+SERVICE_RESPONSE = 0x41
+RESPONSE_OK = 0x00
+RESPONSE_NOT_SUPPORTED = 0x01
+
+# Formula byte of the clock records
+FORMULA_INT = 0x0C
+
+_MEASUREMENTS_BY_IDENTIFIER = {
+    measurement.identifier: measurement for measurement in MEASUREMENTS
+}
+
+
+def build_response(sender, receiver, data, code=RESPONSE_OK):
+    """Build a response telegram carrying data."""
+    telegram = bytearray(b"\x02\x01")
+    telegram += struct.pack(">H", 7 + 4 + len(data) + 1 + 3)
+    telegram += bytes([receiver, sender])
+    telegram.append(crc8_block(CRC_8_OFFSET, telegram))
+    telegram += bytes([SERVICE_RESPONSE, code])
+    telegram += struct.pack(">H", len(data))
+    telegram += data
+    telegram.append((CRC_8_OFFSET + sum(data)) & 0xFF)
+    telegram += struct.pack(
+        ">H", crc16_block(crc16_block(CRC_16_OFFSET, telegram), b"\x03")
+    )
+    telegram.append(0x03)
+    return bytes(telegram)
+
+
+class SimulatedInverter:
+    """One inverter on the simulated bus.
+
+    The measurements follow ac_power, which can be changed at any time.
+    """
+
+    def __init__(
+        self,
+        address=1,
+        ac_power=2500.0,
+        nominal_power=8000.0,
+        panel_voltage=600.0,
+        efficiency=0.96,
+        daily_yield=0.0,
+        status="Grid feed-in",
+    ):
+        self.address = address
+        self.ac_power = ac_power
+        self.nominal_power = nominal_power
+        self.panel_voltage = panel_voltage
+        self.efficiency = efficiency
+        self.daily_yield = daily_yield
+        self.status = status
+        # Silent inverters do not answer at all, like at night
+        self.asleep = False
+        # Identifiers answered with "Service Not Supported"
+        self.not_supported: set[int] = set()
+        # Identifiers that get no answer, like replies lost on the bus
+        self.silent: set[int] = set()
+        self.requests = 0
+
+    def values(self):
+        """Return the current value of every float measurement by key."""
+        panel_power = self.ac_power / self.efficiency if self.ac_power else 0.0
+        return {
+            "ac_power": self.ac_power,
+            "panel_power": panel_power,
+            "panel_voltage": self.panel_voltage if self.ac_power else 0.0,
+            "panel_current": panel_power / self.panel_voltage
+            if self.ac_power
+            else 0.0,
+            "nominal_power": self.nominal_power,
+            "daily_yield": self.daily_yield,
+        }
+
+    def respond(self, identifier):
+        """Return the response telegram for identifier, None to stay silent."""
+        if self.asleep or identifier in self.silent:
+            return None
+        self.requests += 1
+
+        measurement = _MEASUREMENTS_BY_IDENTIFIER.get(identifier)
+        if measurement is None or identifier in self.not_supported:
+            return build_response(
+                self.address,
+                SenderAddress[0],
+                bytes([identifier]),
+                RESPONSE_NOT_SUPPORTED,
+            )
+
+        if measurement.decoder == DECODE_TIME:
+            data = self._time_data(identifier, measurement.offset)
+        else:
+            value = self.values()[measurement.key]
+            data = self._value_data(
+                identifier,
+                measurement.offset,
+                # Without production the inverter sends no AC power value
+                measurement.formula
+                if value or measurement.key != "ac_power"
+                else FORMULA_NOT_AVAILABLE,
+                value,
+            )
+        return build_response(self.address, SenderAddress[0], data)
+
+    def _value_data(self, identifier, offset, formula, value):
+        # The identifier is echoed first, then padding up to the record
+        data = bytearray([identifier])
+        data += bytes(offset - DATA_START - 1)
+        data += float_to_record(formula, value)
+        return bytes(data)
+
+    def _time_data(self, identifier, offset):
+        now = datetime.now()
+        data = bytearray([identifier])
+        data += bytes(offset - DATA_START - 1)
+        for value in (now.year, now.month, now.day, now.hour, now.minute, now.second):
+            data += bytes([FORMULA_INT]) + struct.pack(">h", value) + b"\x00"
+        data += bytes(3)
+        data += self.status.encode()
+        return bytes(data)
+
+
+class StecaSimulator:
+    """TCP server acting as a RS485 gateway with inverters behind it."""
+
+    def __init__(
+        self,
+        inverters=None,
+        host="127.0.0.1",
+        port=0,
+        rtt=0.0,
+        latency=0.0,
+        jitter=0.0,
+        split_rate=0.0,
+        truncate_rate=0.0,
+        concatenate_rate=0.0,
+        corrupt_rate=0.0,
+        queue_depth=None,
+        seed=None,
+    ):
+        """Create the simulator, port 0 picks a free port.
+
+        rtt (seconds) is the network round trip, paid once for all telegrams
+        that arrive together. latency and jitter (seconds) delay every reply,
+        like the time the inverter and the RS485 bus take. The rates (0-1) are
+        the share of replies that are split over two writes, cut short,
+        followed by stray bytes or sent with a broken CRC. queue_depth is the
+        number of requests the gateway holds while the bus is busy, requests
+        beyond it are dropped (None: all are held).
+        """
+        if inverters is None:
+            inverters = [SimulatedInverter()]
+        self.inverters = {inverter.address: inverter for inverter in inverters}
+        self.host = host
+        self.port = port
+        self.rtt = rtt
+        self.latency = latency
+        self.jitter = jitter
+        self.split_rate = split_rate
+        self.truncate_rate = truncate_rate
+        self.concatenate_rate = concatenate_rate
+        self.corrupt_rate = corrupt_rate
+        self.queue_depth = queue_depth
+        self.connections = 0
+        self.dropped = 0
+        self._random = random.Random(seed)
+        self._server: asyncio.Server | None = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        decoder = StecaFrameDecoder()
+        try:
+            while data := await reader.read(1024):
+                if self.rtt:
+                    await asyncio.sleep(self.rtt)
+                decoder.feed(data)
+                queued = 0
+                while (request := decoder.next_frame()) is not None:
+                    if self.queue_depth is not None and queued > self.queue_depth:
+                        self.dropped += 1
+                        continue
+                    queued += 1
+                    await self._answer(request, writer)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _answer(self, request, writer):
+        inverter = self.inverters.get(request[4])
+        if inverter is None or len(request) <= DATA_START:
+            return
+        response = inverter.respond(request[DATA_START])
+        if response is None:
+            return
+
+        delay = self.latency + self._random.uniform(0, self.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+
+        rand = self._random.random
+        if rand() < self.corrupt_rate:
+            response = bytearray(response)
+            response[-2] ^= 0xFF
+            response = bytes(response)
+        if rand() < self.truncate_rate:
+            response = response[: self._random.randrange(1, len(response))]
+        if rand() < self.concatenate_rate:
+            response += bytes([FRAME_START]) + bytes(
+                self._random.randrange(256) for _ in range(RECORD_LENGTH)
+            )
+
+        if len(response) > 1 and rand() < self.split_rate:
+            cut = self._random.randrange(1, len(response))
+            writer.write(response[:cut])
+            await writer.drain()
+            await asyncio.sleep(0.001)
+            response = response[cut:]
+        writer.write(response)
+        await writer.drain()
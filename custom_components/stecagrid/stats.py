@@ -0,0 +1,170 @@
+"""Request statistics for StecaGrid connectors.
+
+Timings are kept in fixed-size rolling windows, so the memory used does not
+grow with uptime. Everything here is exposed through the diagnostics download
+and the diagnostic sensors.
+"""
+
+from array import array
+from collections import deque
+import time
+
+# Samples kept per histogram and raw telegrams kept per connector
+HISTOGRAM_SIZE = 128
+RAW_FRAMES = 20
+
+
+class RollingHistogram:
+    """The last `size` samples of a value."""
+
+    def __init__(self, size=HISTOGRAM_SIZE):
+        self._samples = array("d", bytes(8 * size))
+        self._size = size
+        self._next = 0
+        self.count = 0
+
+    def add(self, value):
+        self._samples[self._next] = value
+        self._next = (self._next + 1) % self._size
+        self.count += 1
+
+    def samples(self):
+        """Return the samples in the window, oldest first."""
+        if self.count < self._size:
+            return self._samples[: self._next].tolist()
+        return (self._samples[self._next :] + self._samples[: self._next]).tolist()
+
+    def last(self):
+        return self._samples[self._next - 1] if self.count else None
+
+    def as_dict(self):
+        samples = sorted(self.samples())
+        if not samples:
+            return {"count": 0}
+
+        def pct(value):
+            return samples[min(len(samples) - 1, int(value / 100 * len(samples)))]
+
+        return {
+            "count": self.count,
+            "mean": sum(samples) / len(samples),
+            "p50": pct(50),
+            "p95": pct(95),
+            "p99": pct(99),
+            "max": samples[-1],
+        }
+
+
+class RequestTrace:
+    """Measurements of a single exchange, filled in by the bus."""
+
+    __slots__ = (
+        "connect",
+        "first_byte",
+        "total",
+        "bytes_out",
+        "bytes_in",
+        "retries",
+        "crc_errors",
+    )
+
+    def __init__(self):
+        self.connect = None
+        self.first_byte = None
+        self.total = None
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.retries = 0
+        self.crc_errors = 0
+
+
+class RequestStats:
+    """Totals and timing windows for one request identifier."""
+
+    def __init__(self):
+        self.requests = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.retries = 0
+        self.crc_errors = 0
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.connect = RollingHistogram()
+        self.first_byte = RollingHistogram()
+        self.round_trip = RollingHistogram()
+
+    def add(self, trace: RequestTrace, error=None):
+        self.requests += 1
+        self.retries += trace.retries
+        self.crc_errors += trace.crc_errors
+        self.bytes_out += trace.bytes_out
+        self.bytes_in += trace.bytes_in
+        if trace.connect is not None:
+            self.connect.add(trace.connect)
+        if trace.first_byte is not None:
+            self.first_byte.add(trace.first_byte)
+        if error is not None:
+            self.failures += 1
+            if isinstance(error, TimeoutError):
+                self.timeouts += 1
+        elif trace.total is not None:
+            self.round_trip.add(trace.total)
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "retries": self.retries,
+            "crc_errors": self.crc_errors,
+            "bytes_out": self.bytes_out,
+            "bytes_in": self.bytes_in,
+            "connect": self.connect.as_dict(),
+            "first_byte": self.first_byte.as_dict(),
+            "round_trip": self.round_trip.as_dict(),
+        }
+
+
+class ConnectorStats:
+    """Statistics of one connector, per identifier and per update cycle."""
+
+    def __init__(self, raw_frames=RAW_FRAMES):
+        self.identifiers: dict[int, RequestStats] = {}
+        self.cycles = RollingHistogram()
+        # 1 for cycles that succeeded, 0 for failed ones
+        self.cycle_results = RollingHistogram()
+        self.frames = deque(maxlen=raw_frames)
+
+    def add_request(self, identifier, trace: RequestTrace, error=None):
+        stats = self.identifiers.get(identifier)
+        if stats is None:
+            stats = self.identifiers[identifier] = RequestStats()
+        stats.add(trace, error)
+
+    def add_frame(self, direction, frame):
+        self.frames.append((time.time(), direction, frame))
+
+    def add_cycle(self, duration, success):
+        self.cycles.add(duration)
+        self.cycle_results.add(1.0 if success else 0.0)
+
+    def success_rate(self):
+        """Return the share of successful cycles in the window, in percent."""
+        results = self.cycle_results.samples()
+        if not results:
+            return None
+        return round(100 * sum(results) / len(results), 1)
+
+    def as_dict(self):
+        return {
+            "cycles": self.cycles.as_dict(),
+            "success_rate": self.success_rate(),
+            "identifiers": {
+                identifier: stats.as_dict()
+                for identifier, stats in sorted(self.identifiers.items())
+            },
+            "frames": [
+                {"time": timestamp, "direction": direction, "data": frame.hex()}
+                for timestamp, direction, frame in self.frames
+            ],
+        }
@@ -1,101 +1,709 @@
 import asyncio
+from collections import deque
+import math
 import socket
 import struct
+import time
 
 from logging import getLogger
 
+from .crc import (
+    CRC_8_OFFSET,
+    CRC_16_OFFSET,
+    FRAME_HEADER_LENGTH,
+    crc8_block,
+    crc16_block,
+    trailer_crc_ok,
+)
+from .measurements import (
+    DECODE_TIME,
+    MEASUREMENTS,
+    MEASUREMENTS_BY_KEY,
+    Measurement,
+)
+from .resilience import RETRY_ATTEMPTS, CircuitBreaker, backoff_delay
+from .response import StecaResponse, value_to_float
+from .stats import ConnectorStats, RequestTrace
+
 _LOGGER = getLogger(__name__)
 
 ### Constants
 PowerOutput_MIN = 0.0
 PowerOutput_MAX = 10000.0
 
+# Gateway connection
+CONNECT_TIMEOUT = 3.0
+RESPONSE_TIMEOUT = 2.0
+# Least time a telegram of a batch gets under a deadline, see _expiry
+RESPONSE_MIN_TIMEOUT = 0.5
+RESPONSE_MAX_LENGTH = 1024
+KEEPALIVE_IDLE = 30
+KEEPALIVE_INTERVAL = 10
+KEEPALIVE_COUNT = 3
+# Minimum pause between telegrams on the bus (seconds): after a response
+# before the next request, and between the telegrams of a pipelined batch
+FRAME_GAP = 0.01
+# Pipelined batches out of the last PIPELINE_WINDOW that may lose responses
+# before pipelining is given up, and the seconds until it is tried again
+PIPELINE_MAX_LOSSES = 3
+PIPELINE_WINDOW = 10
+PIPELINE_RETRY_INTERVAL = 3600
+
+# Bus scheduler priorities, lower values are served first
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+PRIORITIES = (PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW)
+
 ### Variables
-ReceiverAddress = b"\x01"
+ReceiverAddress = b"\x01"  # default inverter address
 SenderAddress = b"\xc9"
 ServiceCode = b"\x40"
 AuthLevel = b"\x01"
 DataLength = bytearray(b"\x00\x01")
 # Identifier = b'\x29'
 
-CRC_8_OFFSET = 0x55
-CRC_16_OFFSET = 0x5555
-
-# A list of 16 CRC-8 values
-CRC8_Table = [
-    0x00,
-    0x8F,
-    0x27,
-    0xA8,
-    0x4E,
-    0xC1,
-    0x69,
-    0xE6,
-    0x9C,
-    0x13,
-    0xBB,
-    0x34,
-    0xD2,
-    0x5D,
-    0xF5,
-    0x7A,
-]
-# A list of 16 CRC-16 values
-CRC16_Table = [
-    0x0000,
-    0xACAC,
-    0xEC05,
-    0x40A9,
-    0x6D57,
-    0xC1FB,
-    0x8152,
-    0x2DFE,
-    0xDAAE,
-    0x7602,
-    0x36AB,
-    0x9A07,
-    0xB7F9,
-    0x1B55,
-    0x5BFC,
-    0xF750,
-]
+# Identifiers polled by the integration, their telegrams are prebuilt
+REQUEST_IDENTIFIERS = tuple(measurement.identifier for measurement in MEASUREMENTS)
+# Identifier used to check whether a sleeping inverter woke up (AC power)
+PROBE_IDENTIFIER = 41
+# Unanswered requests in a row before the inverter is considered asleep
+SLEEP_AFTER_FAILURES = 3
+
+# Inverter addresses probed by discover_inverters() and the probe timeout
+DISCOVERY_ADDRESSES = range(1, 33)
+DISCOVERY_TIMEOUT = 0.3
+
+# Gateway scan, see scan_gateways(): the port of the LAN-to-RS485
+# converters, hosts tried at once, timeouts (seconds) and the identifier of
+# the confirmation request (inverter time)
+SCAN_PORT = 23
+SCAN_CONCURRENCY = 64
+SCAN_CONNECT_TIMEOUT = 0.3
+SCAN_CONFIRM_TIMEOUT = 1.0
+SCAN_IDENTIFIER = 4
+
+# Telegram framing
+FRAME_START = 0x02
+REQUEST_IDENTIFIER_POS = 11
+FRAME_MIN_LENGTH = FRAME_HEADER_LENGTH + 3  # header, CRC16 and end byte
+
+
+class StecaFrameDecoder:
+    """Incremental decoder that splits a byte stream into telegrams.
+
+    A telegram starts with 0x02, carries its total length in bytes 2-3 of the
+    header, is protected by a CRC8 over the header and a CRC16 over the rest,
+    and ends with 0x03. Bytes that do not form a valid telegram are skipped
+    until the next start byte.
+    """
+
+    def __init__(self, max_length=RESPONSE_MAX_LENGTH):
+        self._buffer = bytearray()
+        self._pos = 0
+        self._max_length = max_length
+        self.discarded = 0
+        self.crc_errors = 0
+        # Sender address of the last telegram with a valid header that failed
+        # its CRC16, None since the last reset
+        self.corrupt_sender = None
+
+    def feed(self, data):
+        """Append received bytes to the decoder."""
+        if self._pos:
+            # Drop consumed bytes before growing the buffer
+            del self._buffer[: self._pos]
+            self._pos = 0
+        self._buffer += data
+
+    def reset(self):
+        """Discard everything that has been fed so far."""
+        self._buffer.clear()
+        self._pos = 0
+        self.corrupt_sender = None
+
+    @property
+    def buffered(self):
+        """Number of bytes fed but not decoded yet, e.g. a partial telegram."""
+        return len(self._buffer) - self._pos
+
+    def next_frame(self):
+        """Return the next complete telegram, or None if more data is needed."""
+        buf = self._buffer
+        with memoryview(buf) as view:
+            while True:
+                start = buf.find(FRAME_START, self._pos)
+                if start == -1:
+                    self._skip(len(buf))
+                    return None
+                self._skip(start)
+
+                if len(buf) - start < FRAME_HEADER_LENGTH:
+                    return None
+
+                length = buf[start + 2] << 8 | buf[start + 3]
+                header_crc = crc8_block(
+                    CRC_8_OFFSET, view[start : start + FRAME_HEADER_LENGTH - 1]
+                )
+                # Check the header first, its length field is not trusted
+                # before that.
+                if header_crc != buf[start + FRAME_HEADER_LENGTH - 1]:
+                    self.crc_errors += 1
+                    self._skip(start + 1)
+                    continue
+                if not FRAME_MIN_LENGTH <= length <= self._max_length:
+                    self._skip(start + 1)
+                    continue
+
+                end = start + length
+                if len(buf) < end:
+                    return None
+
+                if not trailer_crc_ok(view[start:end]):
+                    self.crc_errors += 1
+                    self.corrupt_sender = buf[start + 5]
+                    self._skip(start + 1)
+                    continue
+
+                self._pos = end
+                return bytes(view[start:end])
+
+    def _skip(self, pos):
+        if pos > self._pos:
+            self.discarded += pos - self._pos
+            _LOGGER.debug(f"Skipping {pos - self._pos} bytes of invalid data")
+            self._pos = pos
+
+
+class StecaConnectionError(Exception):
+    """The inverter did not answer."""
+
+
+class StecaGatewayUnavailable(StecaConnectionError):
+    """The gateway is known to be unreachable, the request was not sent."""
+
+
+class StecaInvalidResponse(StecaConnectionError):
+    """The inverter answered, but the response carries no valid value."""
+
+
+class StecaCorruptResponse(StecaConnectionError):
+    """The response of the inverter failed its CRC check."""
+
+
+def _retryable(err):
+    """Return True if a request that failed with err may be sent again."""
+    # ConnectionAbortedError: the request was still queued when the bus closed
+    return isinstance(
+        err, (TimeoutError, OSError, StecaCorruptResponse)
+    ) and not isinstance(err, ConnectionAbortedError)
+
+
+def _configure_socket(sock):
+    """Disable Nagle and enable TCP keepalive on the gateway socket."""
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    # The fine grained keepalive options are not available on every platform
+    if hasattr(socket, "TCP_KEEPIDLE"):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, KEEPALIVE_IDLE)
+    if hasattr(socket, "TCP_KEEPINTVL"):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, KEEPALIVE_INTERVAL)
+    if hasattr(socket, "TCP_KEEPCNT"):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, KEEPALIVE_COUNT)
+
+
+def _expiry(timeout, deadline=None, pending=1):
+    """Return the loop time at which a request started now times out.
+
+    Under a deadline, the request only gets its share of the time left for
+    the pending requests (itself included), but at least RESPONSE_MIN_TIMEOUT,
+    so one lost response does not use up the time of the others.
+    """
+    now = asyncio.get_running_loop().time()
+    expiry = now + timeout
+    if deadline is None:
+        return expiry
+    share = max((deadline - now) / pending, RESPONSE_MIN_TIMEOUT)
+    return min(expiry, now + share, deadline)
+
+
+class StecaBus:
+    """Scheduler for one RS485 gateway (host, port).
+
+    The RS485 bus is half-duplex, so only one request may be in flight at a
+    time. Requests from all connectors sharing the gateway are queued and sent
+    one by one over a single connection. Higher priorities are served first and
+    within a priority the clients take turns, so a busy connector cannot starve
+    the others.
+
+    Telegrams are separated by at least frame_gap. A batch of telegrams
+    (request_batch) is sent one telegram at a time, unless pipelining is
+    enabled: the telegrams are then written back-to-back and the responses are
+    matched to the requests as they arrive. That breaks the one request in
+    flight rule, so it is opt-in, for gateways known to buffer the requests.
+    When a gateway keeps losing responses to pipelined telegrams, while the
+    line is otherwise clean, pipelining is suspended and tried again after
+    PIPELINE_RETRY_INTERVAL.
+
+    While the gateway cannot be reached the circuit breaker rejects requests
+    with StecaGatewayUnavailable, see resilience.py.
+    """
+
+    def __init__(self, host, port, pipeline=False, frame_gap=FRAME_GAP):
+        self._host = host
+        self._port = port
+        self.pipeline = pipeline
+        self._frame_gap = frame_gap
+        # Outcome of the recent pipelined batches, True if responses were lost
+        self._pipeline_losses: deque[bool] = deque(maxlen=PIPELINE_WINDOW)
+        # Event loop time until which pipelining is suspended
+        self._pipeline_suspended_until = 0.0
+        # Whether the last failed pipelined batch saw corrupted data
+        self._pipeline_noise = False
+        # Monotonic time the bus was last used
+        self._last_frame = -math.inf
+        self.breaker = CircuitBreaker()
+        # capture.CaptureWriter receiving the telegrams sent and the bytes
+        # received, None when off
+        self.capture = None
+
+        # One queue per priority: client -> pending (telegram, future, timeout,
+        # trace, deadline, keep_connection). Batches are queued as a list of
+        # telegrams and of traces.
+        self._queues: list[dict[object, deque]] = [{} for _ in PRIORITIES]
+        self._wakeup = asyncio.Event()
+        self._worker: asyncio.Task | None = None
+
+        # Long-lived connection to the gateway, opened on first use
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._decoder = StecaFrameDecoder()
+
+    async def request(
+        self,
+        requestMessage,
+        client=None,
+        priority=PRIORITY_NORMAL,
+        timeout=None,
+        trace=None,
+        deadline=None,
+        keep_connection=False,
+    ):
+        """Queue a telegram and wait for the inverter's response.
+
+        timeout limits the time the request may occupy the bus, it defaults
+        to RESPONSE_TIMEOUT. deadline (event loop time) is when the request
+        must be answered at the latest, time spent waiting in the queue
+        included. Timings and byte counts of the exchange are recorded in
+        trace, if given.
+
+        The connection is dropped when a request times out, so a late
+        response is not read as the answer to the next request. With
+        keep_connection it is kept; only use that when the next requests to
+        the same address do not follow right away, e.g. for probes.
+        """
+        if not self.breaker.allow():
+            raise StecaGatewayUnavailable(
+                f"Gateway {self._host}:{self._port} unreachable, next attempt in {self.breaker.retry_in():.0f} s"
+            )
+        future = asyncio.get_running_loop().create_future()
+        self._queues[priority].setdefault(client, deque()).append(
+            (
+                requestMessage,
+                future,
+                timeout or RESPONSE_TIMEOUT,
+                trace,
+                deadline,
+                keep_connection,
+            )
+        )
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._async_run())
+        self._wakeup.set()
+        return await future
+
+    async def request_batch(
+        self,
+        requestMessages,
+        client=None,
+        priority=PRIORITY_NORMAL,
+        timeout=None,
+        traces=None,
+        deadline=None,
+    ):
+        """Send several telegrams in one go and return their responses.
+
+        The telegrams must ask different (address, identifier) pairs. The
+        result holds the response, or the exception, for each telegram in
+        order. timeout applies to the batch as a whole when it is pipelined,
+        and to each telegram otherwise. Telegrams that cannot be answered
+        before the deadline fail with TimeoutError.
+        """
+        if traces is None:
+            traces = [RequestTrace() for _ in requestMessages]
+        return await self.request(
+            list(requestMessages), client, priority, timeout, list(traces), deadline
+        )
+
+    def _next_request(self):
+        """Pop the next request, taking turns between clients."""
+        for queue in self._queues:
+            while queue:
+                client = next(iter(queue))
+                requests = queue.pop(client)
+                request = requests.popleft()
+                if requests:
+                    # Move the client to the back of the line
+                    queue[client] = requests
+                if not request[1].done():
+                    return request
+        return None
+
+    async def _async_run(self):
+        while True:
+            request = self._next_request()
+            if request is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            requestMessage, future, timeout, trace, deadline, keep_connection = request
+            try:
+                if isinstance(requestMessage, list):
+                    msg_response = await self._async_exchange_batch(
+                        requestMessage, trace, timeout, deadline
+                    )
+                else:
+                    async with asyncio.timeout_at(_expiry(timeout, deadline)):
+                        msg_response = await self._async_exchange(
+                            requestMessage, trace or RequestTrace(), keep_connection
+                        )
+            except asyncio.CancelledError:
+                if not future.done():
+                    future.cancel()
+                raise
+            except Exception as err:  # pylint: disable=broad-except
+                if not future.done():
+                    future.set_exception(err)
+            else:
+                # The caller may have given up while the request was in flight
+                if not future.done():
+                    future.set_result(msg_response)
+
+    def _connected(self):
+        """Return True if the gateway connection is open and usable."""
+        return (
+            self._writer is not None
+            and not self._writer.is_closing()
+            and not self._reader.at_eof()
+        )
+
+    async def _async_connect(self):
+        """Open the gateway connection unless an open one can be reused."""
+        if self._connected():
+            return
+
+        self._drop_connection()
+        try:
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(self._host, self._port), CONNECT_TIMEOUT
+            )
+        except (OSError, TimeoutError):
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        sock = self._writer.get_extra_info("socket")
+        if sock is not None:
+            _configure_socket(sock)
+        _LOGGER.debug(f"Connected to gateway {self._host}:{self._port}")
+
+    def _drop_connection(self):
+        """Forget the current connection without waiting for it to close."""
+        if self._writer is not None:
+            self._writer.close()
+        self._decoder.reset()
+        self._reader = None
+        self._writer = None
+
+    async def close(self):
+        """Stop the scheduler, fail queued requests and close the connection."""
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        for queue in self._queues:
+            for requests in queue.values():
+                for _, future, *_ in requests:
+                    if not future.done():
+                        future.set_exception(
+                            ConnectionAbortedError("Gateway connection closed")
+                        )
+            queue.clear()
+
+        writer = self._writer
+        self._drop_connection()
+        if writer is not None:
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    async def _async_frame_gap(self):
+        """Wait until the bus was idle for frame_gap."""
+        delay = self._last_frame + self._frame_gap - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _async_read_frame(self, trace, sent, sender=None):
+        """Read from the gateway until one complete telegram is decoded.
+
+        Raises StecaCorruptResponse as soon as a telegram from sender failed
+        its CRC check, instead of waiting for a response that will not come.
+        """
+        while (frame := self._decoder.next_frame()) is None:
+            if sender is not None and self._decoder.corrupt_sender == sender:
+                raise StecaCorruptResponse(
+                    f"Response from address {sender} failed its CRC check"
+                )
+            data = await self._reader.read(RESPONSE_MAX_LENGTH)
+            if not data:
+                raise ConnectionResetError("Connection closed by gateway")
+            if trace.first_byte is None:
+                trace.first_byte = time.monotonic() - sent
+            trace.bytes_in += len(data)
+            if self.capture is not None:
+                self.capture.write("rx", data)
+            self._decoder.feed(data)
+        return frame
+
+    async def _async_read_response(self, requestMessage, trace, sent):
+        """Read telegrams until one is the reply from the addressed inverter."""
+        while True:
+            frame = await self._async_read_frame(trace, sent, requestMessage[4])
+            # Replies swap the addresses of the request
+            if frame[5] == requestMessage[4]:
+                return frame
+            _LOGGER.debug(
+                f"Ignoring telegram from address {frame[5]} while waiting for {requestMessage[4]}"
+            )
+
+    async def _async_exchange(self, requestMessage, trace, keep_connection=False):
+        """Send one telegram and return the raw response.
+
+        The connection is kept open between requests. If a reused connection
+        turns out to be dead (reset, or closed by the gateway) it is reopened
+        and the request is sent once more. A timeout drops the connection,
+        unless keep_connection is set.
+        """
+        start = time.monotonic()
+        crc_errors = self._decoder.crc_errors
+        try:
+            for attempt in range(2):
+                reused = self._connected()
+                if not reused:
+                    await self._async_connect()
+                    trace.connect = time.monotonic() - start
+                await self._async_frame_gap()
+                # Anything left over from an earlier exchange is stale
+                self._decoder.reset()
+                try:
+                    self._writer.write(requestMessage)
+                    trace.bytes_out += len(requestMessage)
+                    if self.capture is not None:
+                        self.capture.write("tx", requestMessage)
+                    sent = time.monotonic()
+                    await self._writer.drain()
+                    return await self._async_read_response(
+                        requestMessage, trace, sent
+                    )
+                except OSError:
+                    self._drop_connection()
+                    if reused and attempt == 0:
+                        _LOGGER.debug("Gateway connection lost, reconnecting")
+                        trace.retries += 1
+                        continue
+                    raise
+                except StecaCorruptResponse:
+                    # The response was read in full, the connection is clean
+                    raise
+                except asyncio.CancelledError:
+                    # Timeout or cancellation mid-exchange: a late response
+                    # would otherwise be read as the answer to the next request.
+                    # Responses to other addresses are ignored anyway.
+                    if not keep_connection:
+                        self._drop_connection()
+                    raise
+                except BaseException:
+                    self._drop_connection()
+                    raise
+        finally:
+            self._last_frame = time.monotonic()
+            trace.total = self._last_frame - start
+            trace.crc_errors = self._decoder.crc_errors - crc_errors
+
+    async def _async_exchange_batch(
+        self, requestMessages, traces, timeout, deadline=None
+    ):
+        """Exchange a batch of telegrams, pipelined if the gateway allows it."""
+        loop = asyncio.get_running_loop()
+        if (
+            not self.pipeline
+            or loop.time() < self._pipeline_suspended_until
+            or len(requestMessages) == 1
+        ):
+            results = []
+            for index, (requestMessage, trace) in enumerate(
+                zip(requestMessages, traces)
+            ):
+                if deadline is not None and loop.time() >= deadline:
+                    # Out of time, do not occupy the bus any longer
+                    results.append(TimeoutError())
+                    continue
+                expiry = _expiry(timeout, deadline, len(requestMessages) - index)
+                try:
+                    async with asyncio.timeout_at(expiry):
+                        results.append(
+                            await self._async_exchange(requestMessage, trace)
+                        )
+                except Exception as err:  # pylint: disable=broad-except
+                    results.append(err)
+            return results
+
+        if deadline is not None and loop.time() >= deadline:
+            return [TimeoutError() for _ in requestMessages]
+        results = [None] * len(requestMessages)
+        try:
+            async with asyncio.timeout_at(_expiry(timeout, deadline)):
+                await self._async_pipeline(requestMessages, traces, results)
+        except Exception as err:  # pylint: disable=broad-except
+            if isinstance(err, TimeoutError) and any(results):
+                if self._pipeline_noise:
+                    # Corrupted or cut short on the line, a serial exchange
+                    # would have lost them too
+                    _LOGGER.debug("Pipelined responses lost to line noise")
+                else:
+                    # Responses got lost while others came through cleanly
+                    self._pipeline_losses.append(True)
+                if sum(self._pipeline_losses) >= PIPELINE_MAX_LOSSES:
+                    _LOGGER.info(
+                        f"Gateway {self._host}:{self._port} drops pipelined requests, sending them one at a time for {PIPELINE_RETRY_INTERVAL} s"
+                    )
+                    self._pipeline_losses.clear()
+                    self._pipeline_suspended_until = (
+                        loop.time() + PIPELINE_RETRY_INTERVAL
+                    )
+            results = [err if result is None else result for result in results]
+        else:
+            self._pipeline_losses.append(False)
+        return results
+
+    async def _async_pipeline(self, requestMessages, traces, results):
+        """Write all telegrams, then read responses until each is answered."""
+        start = time.monotonic()
+        crc_errors = self._decoder.crc_errors
+        # Replies swap the addresses and echo the identifier
+        pending = {
+            (requestMessage[4], requestMessage[REQUEST_IDENTIFIER_POS]): index
+            for index, requestMessage in enumerate(requestMessages)
+        }
+        try:
+            for attempt in range(2):
+                reused = self._connected()
+                if not reused:
+                    await self._async_connect()
+                    traces[0].connect = time.monotonic() - start
+                await self._async_frame_gap()
+                self._decoder.reset()
+                noise = (self._decoder.crc_errors, self._decoder.discarded)
+                try:
+                    for index, (requestMessage, trace) in enumerate(
+                        zip(requestMessages, traces)
+                    ):
+                        if index and self._frame_gap:
+                            await self._writer.drain()
+                            await asyncio.sleep(self._frame_gap)
+                        self._writer.write(requestMessage)
+                        trace.bytes_out += len(requestMessage)
+                        if self.capture is not None:
+                            self.capture.write("tx", requestMessage)
+                    sent = time.monotonic()
+                    await self._writer.drain()
+
+                    while pending:
+                        frame = await self._async_read_frame(RequestTrace(), sent)
+                        key = (
+                            frame[5],
+                            frame[REQUEST_IDENTIFIER_POS]
+                            if len(frame) > REQUEST_IDENTIFIER_POS
+                            else None,
+                        )
+                        index = pending.pop(key, None)
+                        if index is None:
+                            _LOGGER.debug(f"Ignoring unexpected telegram {key}")
+                            continue
+                        now = time.monotonic()
+                        trace = traces[index]
+                        trace.first_byte = trace.total = now - sent
+                        trace.bytes_in += len(frame)
+                        results[index] = frame
+                    return
+                except OSError:
+                    self._drop_connection()
+                    if reused and attempt == 0 and len(pending) == len(results):
+                        _LOGGER.debug("Gateway connection lost, reconnecting")
+                        for trace in traces:
+                            trace.retries += 1
+                        continue
+                    raise
+                except BaseException:
+                    # Invalid bytes or a partial telegram mean the line lost
+                    # responses, not the pipelining
+                    self._pipeline_noise = bool(
+                        noise != (self._decoder.crc_errors, self._decoder.discarded)
+                        or self._decoder.buffered
+                    )
+                    # Responses still in flight must not be read as answers
+                    # to the next request
+                    self._drop_connection()
+                    raise
+        finally:
+            self._last_frame = time.monotonic()
+            total = self._last_frame - start
+            for index in pending.values():
+                traces[index].total = total
+            traces[0].crc_errors = self._decoder.crc_errors - crc_errors
 
 
 class StecaConnector:
-    def __init__(self, host, port):
+    def __init__(self, host, port, bus=None, address=ReceiverAddress[0]):
         self._host = host
         self._port = port
+        self.address = address
+        self._receiver_address = bytes([address])
         self._previous_value = PowerOutput_MIN
         self._errorcount = 0
+        # Set after SLEEP_AFTER_FAILURES unanswered requests in a row, e.g. at night
+        self.asleep = False
         self.current_power_output = 0
         self.current_timestamp: str = "yyyy-MM-dd HH:mm:ss"
         self.timestamp_status: str = False
 
-    # A function that takes a current CRC value, a data buffer, and a data length as parameters
-    def RS485_CRC8_Block(self, currentCrc, data):
-        # Loop through the data buffer
-        for value in data:
-            # XOR in the data
-            currentCrc ^= value
-            # Perform the XORing for each nibble
-            currentCrc = (currentCrc >> 4) ^ CRC8_Table[currentCrc & 0x0F]
-            currentCrc = (currentCrc >> 4) ^ CRC8_Table[currentCrc & 0x0F]
+        # Request timings and recent telegrams, for diagnostics
+        self.stats = ConnectorStats()
 
-        # Return the final CRC value
-        return currentCrc
+        # Gateway connections can be shared by several connectors
+        self._owns_bus = bus is None
+        self._bus = bus if bus is not None else StecaBus(host, port)
 
-    # A function that takes a current CRC value, a data buffer, and a data length as parameters
-    def RS485_CRC16_Block(self, currentCrc, data):
-        # Loop through the data buffer
-        for value in data:
-            # XOR in the data
-            currentCrc ^= value
-            # Perform the XORing for each nibble
-            currentCrc = (currentCrc >> 4) ^ CRC16_Table[currentCrc & 0x000F]
-            currentCrc = (currentCrc >> 4) ^ CRC16_Table[currentCrc & 0x000F]
+        # Request telegrams keyed by (receiver address, request data)
+        self._telegrams: dict[tuple[bytes, bytes], bytes] = {}
+        for identifier in REQUEST_IDENTIFIERS:
+            self.GenerateRequestTelegram(identifier)
 
-        # Return the final CRC value
-        return currentCrc
+    def RS485_CRC8_Block(self, currentCrc, data):
+        return crc8_block(currentCrc, data)
+
+    def RS485_CRC16_Block(self, currentCrc, data):
+        return crc16_block(currentCrc, data)
 
     def frameCRC(self, CRCOffset, data):
         total = CRCOffset
@@ -119,10 +727,7 @@ class StecaConnector:
                 return None
 
             # Reconstruct 24-bit value into 32-bit float representation
-            temp_int = ((b2 << 8 | b0) << 8 | b1) << 7
-            temp_bytes = temp_int.to_bytes(4, byteorder='big', signed=False)
-
-            power_output = struct.unpack(">f", temp_bytes)[0]
+            power_output = value_to_float(b0, b1, b2)
 
         except Exception as e:
             _LOGGER.error("Error parsing inverter data: %s", e)
@@ -141,17 +746,92 @@ class StecaConnector:
             )
         return sint
 
-    async def GetInverterTime(self):
-        req = self.GenerateRequestTelegram(4)
-        msg_response = await self.PollInverter(req)
-
-        _LOGGER.debug("Data and time")
-        year = self.formulaToSInt(msg_response[13:15])
-        month = self.formulaToSInt(msg_response[17:19])
-        day = self.formulaToSInt(msg_response[21:23])
-        hour = self.formulaToSInt(msg_response[25:27])
-        minute = self.formulaToSInt(msg_response[29:31])
-        second = self.formulaToSInt(msg_response[33:35])
+    async def GetMeasurement(
+        self, measurement: Measurement, priority=PRIORITY_NORMAL, retries=RETRY_ATTEMPTS
+    ):
+        """Request one measurement from the inverter and decode it."""
+        req = self.GenerateRequestTelegram(measurement.identifier)
+        msg_response = await self.PollInverter(req, priority, retries)
+        return self._DecodeMeasurement(measurement, msg_response)
+
+    async def GetMeasurements(self, measurements, deadline=None):
+        """Request several measurements in one batch.
+
+        Returns the decoded value of each measurement by key, or the
+        StecaConnectionError if it could not be read (before the deadline,
+        in event loop time) or StecaInvalidResponse if it could not be decoded.
+        """
+        measurements = list(measurements)
+        responses = await self.PollInverterBatch(
+            [
+                self.GenerateRequestTelegram(measurement.identifier)
+                for measurement in measurements
+            ],
+            deadline=deadline,
+        )
+        results = {}
+        for measurement, msg_response in zip(measurements, responses):
+            if not isinstance(msg_response, StecaConnectionError):
+                try:
+                    msg_response = self._DecodeMeasurement(measurement, msg_response)
+                except StecaInvalidResponse as e:
+                    msg_response = e
+            results[measurement.key] = msg_response
+        return results
+
+    def _DecodeMeasurement(self, measurement: Measurement, msg_response):
+        """Return the value of measurement in a response.
+
+        A response without the value, as sent while the inverter does not
+        produce, gives the minimum. Raises StecaInvalidResponse if the response
+        is incomplete or its value implausible, a failed read is never reported
+        as a real value.
+        """
+        if not isinstance(msg_response, bytes):
+            # Incomplete or unsupported request, PollInverter logged why
+            raise StecaInvalidResponse(
+                msg_response
+                if isinstance(msg_response, str)
+                else f"Incomplete response for {measurement.key}"
+            )
+        if measurement.decoder == DECODE_TIME:
+            return self._DecodeTime(measurement, msg_response)
+        return self._DecodeFloat(measurement, msg_response)
+
+    def _DecodeFloat(self, measurement: Measurement, msg_response: bytes):
+        response = StecaResponse(msg_response, measurement.offset, measurement.records)
+        if not len(response):
+            raise StecaInvalidResponse(
+                f"No {measurement.key} record in response from inverter"
+            )
+        value = response.value_at(0)
+        if response.formula_at(0) != measurement.formula or value is None:
+            # The inverter answers without the value while it does not produce
+            _LOGGER.debug(f"{measurement.key} not available from inverter")
+            value = (
+                PowerOutput_MIN if measurement.minimum is None else measurement.minimum
+            )
+        elif (measurement.minimum is not None and value < measurement.minimum) or (
+            measurement.maximum is not None and value > measurement.maximum
+        ):  # Range check
+            _LOGGER.warning(
+                f"Unusual inverter {measurement.key} '{value}', probably wrong message received from inverter"  # noqa: G004
+            )
+            raise StecaInvalidResponse(f"{measurement.key} {value} out of range")
+
+        _LOGGER.debug(f"{measurement.key}: {value} {measurement.unit}")
+        return round(value, measurement.precision)
+
+    def _DecodeTime(self, measurement: Measurement, msg_response: bytes):
+        response = StecaResponse(msg_response, measurement.offset, measurement.records)
+        if len(response) < measurement.records:
+            raise StecaInvalidResponse(
+                "Incomplete date and time in response from inverter"
+            )
+
+        year, month, day, hour, minute, second = (
+            response.int_at(index) for index in range(measurement.records)
+        )
         _LOGGER.debug(
             f"Date in inverter {year}-{month:02d}-{day:02d} {hour:02d}:{minute:02d}:{second:02d}"
         )
@@ -161,150 +841,68 @@ class StecaConnector:
         self.timestamp_status = msg_response[39 : len(msg_response) - 4].decode(
             "utf-8"
         )
-        # return f"{self.timestamp_status}, status: '{msg_response[39 : len(msg_response) - 4].decode('utf-8')}'"
         return self.current_timestamp
 
-    async def GetACOutput(self):
-        req = self.GenerateRequestTelegram(41)
-        msg_response = await self.PollInverter(req)
-        
-        _LOGGER.debug("AC power")
-        if msg_response[22] == 0x0B:
-            power_output = self.formulaToFloat(msg_response[22:26])
-
-            if (
-                power_output <= PowerOutput_MIN
-                or power_output > PowerOutput_MAX
-            ):  # Range check
-                _LOGGER.warning(
-                    f"Unusual inverter power '{power_output}', probably wrong message received from inverter"  # noqa: G004
-                )
-                power_output = PowerOutput_MIN
-
-        else:
-            _LOGGER.info("Ingen solproduktion")
-            power_output = PowerOutput_MIN
+    async def GetInverterTime(self):
+        return await self.GetMeasurement(MEASUREMENTS_BY_KEY["time"])
 
+    async def GetACOutput(self):
+        power_output = await self.GetMeasurement(MEASUREMENTS_BY_KEY["ac_power"])
         self._previous_value = power_output
         self.current_power_output = power_output
-        return round(self.current_power_output, 1)
-    
-    async def GetDailyYield(self):
-        req = self.GenerateRequestTelegram(60)
-        msg_response = await self.PollInverter(req)
-
-        _LOGGER.debug("daily yield from inverter")
-
-        daily_yield = PowerOutput_MIN
-
-        # Find the formula byte 0x09 for CurrentDayYield
-        formula_index = msg_response.find(b'\x09')
-        if formula_index != -1 and len(msg_response) >= formula_index + 4:
-            yield_bytes = msg_response[formula_index : formula_index + 4]  # 4 bytes
-            daily_yield = self.formulaToFloat(yield_bytes)
-
-        else:
-            _LOGGER.info("Ingen solproduktion")
-
-        print("Daily Yield (Wh):", round(daily_yield, 1))
+        return power_output
 
-        self._previous_value = daily_yield
-        self.current_power_output = daily_yield
-        return round(daily_yield, 1)
+    async def GetDailyYield(self):
+        return await self.GetMeasurement(MEASUREMENTS_BY_KEY["daily_yield"])
 
     async def GetNominalPower(self):
-        req = self.GenerateRequestTelegram(29)
-        msg_response = await self.PollInverter(req)
-
-        _LOGGER.debug("Nominal AC Power from inverter")
-
-        try:
-            formula_index = msg_response.find(b'\x0b', 15)  # find first 0x0B
-            if formula_index == -1 or len(msg_response) < formula_index + 5:
-                print("Panel power bytes not found")
-                return 0.0
-
-            power_bytes = msg_response[formula_index : formula_index + 4]  # 4 bytes after 0x0B
-            power_output = self.formulaToFloat(power_bytes)
-            # print("Panel Power (W):", round(power_output, 3))
-            return round(power_output, 3)
-        
-        except Exception as e:
-            _LOGGER.error("Fejl ved parsing af inverterdata i GetPanelOutput! - der er sikkert overskyet. error=%s", e)
-            return PowerOutput_MIN
+        return await self.GetMeasurement(MEASUREMENTS_BY_KEY["nominal_power"])
 
     async def GetPanelOutput(self):
-        req = self.GenerateRequestTelegram(34)
-        msg_response = await self.PollInverter(req)
-        
-        try:
-            formula_index = msg_response.find(b'\x0b', 15)  # find first 0x0B
-            if formula_index == -1 or len(msg_response) < formula_index + 5:
-                print("Panel power bytes not found")
-                return 0.0
-
-            power_bytes = msg_response[formula_index : formula_index + 4]  # 4 bytes after 0x0B
-            power_output = self.formulaToFloat(power_bytes)
-            print("Panel Power (W):", round(power_output, 3))
-            return round(power_output, 3)
-        
-        except Exception as e:
-            _LOGGER.error("Fejl ved parsing af inverterdata i GetPanelOutput! - der er sikkert overskyet. error=%s", e)
-            return PowerOutput_MIN
+        return await self.GetMeasurement(MEASUREMENTS_BY_KEY["panel_power"])
 
     async def GetPanelVoltage(self):
-        req = self.GenerateRequestTelegram(35)
-        msg_response = await self.PollInverter(req)
-        
-        try:
-            formula_index = msg_response.find(b'\x05', 15)  # find first 0x0B
-            if formula_index == -1 or len(msg_response) < formula_index + 5:
-                print("Panel voltage bytes not found")
-                return 0.0
-            
-            power_bytes = msg_response[formula_index : formula_index + 4]  # 4 bytes after 0x0B
-            power_output = self.formulaToFloat(power_bytes)
-            print("Panel voltage (V):", round(power_output, 3))
-            return round(power_output, 3)
-        
-        except Exception as e:
-            _LOGGER.error("Fejl ved parsing af inverterdata i GetPanelOutput! - der er sikkert overskyet. error=%s", e)
-            return PowerOutput_MIN
+        return await self.GetMeasurement(MEASUREMENTS_BY_KEY["panel_voltage"])
 
     async def GetPanelCurrent(self):
-        req = self.GenerateRequestTelegram(36)
-        msg_response = await self.PollInverter(req)
-        
-        try:
-            formula_index = msg_response.find(b'\x07', 15)  # find first 0x0B
-            if formula_index == -1 or len(msg_response) < formula_index + 5:
-                print("Panel Current bytes not found")
-                return 0.0
-            
-            power_bytes = msg_response[formula_index : formula_index + 4]  # 4 bytes after 0x0B
-            power_output = self.formulaToFloat(power_bytes)
-            print("Panel Current (A):", round(power_output, 3))
-            return round(power_output, 3)
-        
-        except Exception as e:
-            _LOGGER.error("Fejl ved parsing af inverterdata i GetPanelOutput! - der er sikkert overskyet. error=%s", e)
-            return PowerOutput_MIN
-            
+        return await self.GetMeasurement(MEASUREMENTS_BY_KEY["panel_current"])
+
     def GenerateRequestTelegram(self, RequestIdentifier):
+        """Return the request telegram for one identifier.
+
+        RequestIdentifier may also be a sequence of identifiers or raw request
+        data (identifier followed by parameters). Telegrams only depend on the
+        request data and the addresses, so each one is built once and then
+        served from the table.
+        """
+        if isinstance(RequestIdentifier, int):
+            RequestData = bytes([RequestIdentifier])
+        else:
+            RequestData = bytes(RequestIdentifier)
+
+        key = (self._receiver_address, RequestData)
+        Telegram = self._telegrams.get(key)
+        if Telegram is None:
+            Telegram = self._telegrams[key] = self.BuildRequestTelegram(RequestData)
+        return Telegram
+
+    def BuildRequestTelegram(self, RequestData):
         ### Generate Dataframe
-        DataFrame = bytearray(b"")
-        DataFrame.extend(bytes([RequestIdentifier]))  # Add Identifier to frame
-        DataFrameCRC = self.frameCRC(CRC_8_OFFSET, DataFrame)  # calculate dataframe CRC
+        DataFrame = bytearray(RequestData)  # Add Identifier(s) to frame
+        DataFrameCRC = self.frameCRC(CRC_8_OFFSET, DataFrame) & 0xFF  # calculate dataframe CRC
         DataFrameLength = bytearray(struct.pack(">h", len(DataFrame)))
         DataFrame.append(DataFrameCRC)  # and append
 
         ### Generate Header
         HeaderBegin = bytearray(b"\x02\x01")
-        HeaderLength = bytearray(b"\x00\x10")
+        # Header, service code, auth level, data length, data, CRC16 and end byte
+        HeaderLength = bytearray(
+            struct.pack(">H", FRAME_HEADER_LENGTH + 4 + len(DataFrame) + 3)
+        )
         Header = bytearray(b"")
         Header.extend(HeaderBegin)
         Header.extend(HeaderLength)
-        Header.extend(ReceiverAddress)
+        Header.extend(self._receiver_address)
         Header.extend(SenderAddress)
         Header.append(self.RS485_CRC8_Block(CRC_8_OFFSET, Header))
 
@@ -325,44 +923,154 @@ class StecaConnector:
         )
         Telegram.extend(b"\x03")
 
-        return Telegram
+        return bytes(Telegram)
 
-    async def PollInverter(self, requestMessage):
+    async def Probe(self):
+        """Send a single cheap request, return True if the inverter answered."""
         try:
-            reader, writer = await asyncio.open_connection(self._host, self._port)
+            await self.PollInverter(
+                self.GenerateRequestTelegram(PROBE_IDENTIFIER), PRIORITY_LOW, retries=0
+            )
+        except StecaConnectionError:
+            return False
+        return True
 
-            # Send request
-            writer.write(requestMessage)
-            await writer.drain()  # Ensure the message is sent
-            # print(f"TX {len(requestMessage)} bytes '{requestMessage.hex()}'")
+    async def close(self):
+        """Close the gateway connection unless it is shared with others."""
+        if self._owns_bus:
+            await self._bus.close()
 
-            # Receive response
-            msg_response = await reader.read(1024)
-            length = len(msg_response)
-            _LOGGER.debug(f"Received {length} bytes '{str(msg_response)}'")
+    async def PollInverter(
+        self, requestMessage, priority=PRIORITY_NORMAL, retries=RETRY_ATTEMPTS
+    ):
+        """Send a request telegram and return the response.
 
-            # Close the connection
-            writer.close()
-            await writer.wait_closed()
+        Failed requests are sent again up to retries times, after a jittered
+        backoff, unless the inverter is asleep or the gateway unreachable.
+        """
+        identifier = requestMessage[REQUEST_IDENTIFIER_POS]
+        for attempt in range(retries + 1):
+            trace = RequestTrace()
+            self._RecordFrame("tx", requestMessage)
+            try:
+                msg_response = await self._bus.request(
+                    requestMessage, client=self, priority=priority, trace=trace
+                )
+            except Exception as e:
+                if attempt < retries and not self.asleep and _retryable(e):
+                    self.stats.add_request(identifier, trace, e)
+                    await asyncio.sleep(backoff_delay(attempt))
+                    continue
+                raise self._PollFailed(identifier, trace, e) from e
+            return self._PollSucceeded(identifier, trace, msg_response)
 
-            # return msg_response
-            print(f"RX {length} bytes '{msg_response.hex()}'")
-            # print(f"RX {length} bytes '{str(msg_response)}'")
+    async def PollInverterBatch(
+        self,
+        requestMessages,
+        priority=PRIORITY_NORMAL,
+        deadline=None,
+        retries=RETRY_ATTEMPTS,
+    ):
+        """Send several request telegrams back-to-back, see StecaBus.request_batch.
 
+        Returns the response to each telegram like PollInverter does, with a
+        StecaConnectionError in place of the responses that failed. Failed
+        telegrams are retried as a smaller batch while the deadline allows.
+        """
+        loop = asyncio.get_running_loop()
+        results = [None] * len(requestMessages)
+        pending = list(range(len(requestMessages)))
+        error = None
+        for attempt in range(retries + 1):
+            if not pending:
+                break
+            traces = [RequestTrace() for _ in pending]
+            for index in pending:
+                self._RecordFrame("tx", requestMessages[index])
+            try:
+                responses = await self._bus.request_batch(
+                    [requestMessages[index] for index in pending],
+                    client=self,
+                    priority=priority,
+                    traces=traces,
+                    deadline=deadline,
+                )
+            except Exception as e:  # pylint: disable=broad-except
+                responses = [e] * len(pending)
 
-        except Exception as e:
+            delay = backoff_delay(attempt)
+            retry = attempt < retries and (
+                deadline is None or loop.time() + delay < deadline
+            )
+            failed = []
+            for index, trace, msg_response in zip(pending, traces, responses):
+                identifier = requestMessages[index][REQUEST_IDENTIFIER_POS]
+                if not isinstance(msg_response, Exception):
+                    results[index] = self._PollSucceeded(
+                        identifier, trace, msg_response
+                    )
+                    continue
+                self.stats.add_request(identifier, trace, msg_response)
+                if retry and not self.asleep and _retryable(msg_response):
+                    failed.append(index)
+                    continue
+                error = StecaConnectionError(
+                    f"No response from Steca inverter {self.address} at {self._host}:{self._port}"
+                )
+                error.__cause__ = msg_response
+                results[index] = error
+            pending = failed
+            if pending:
+                await asyncio.sleep(delay)
+
+        if (
+            error is not None
+            and not isinstance(error.__cause__, StecaCorruptResponse)
+            and all(isinstance(result, StecaConnectionError) for result in results)
+        ):
+            # Nothing answered, that counts as one failed request
+            self._CountFailure(error.__cause__)
+        return results
+
+    def _RecordFrame(self, direction, frame):
+        self.stats.add_frame(direction, frame)
+
+    def _PollFailed(self, identifier, trace, e):
+        """Record a request without response, return the error to raise."""
+        self.stats.add_request(identifier, trace, e)
+        if not isinstance(e, StecaCorruptResponse):
+            # A corrupted response still shows the inverter is awake
+            self._CountFailure(e)
+        return StecaConnectionError(
+            f"No response from Steca inverter {self.address} at {self._host}:{self._port}"
+        )
+
+    def _CountFailure(self, e):
+        """Count a failed request, the inverter is asleep after several."""
+        self._errorcount += 1
+        if self.asleep:
+            _LOGGER.debug(f"Steca inverter still asleep. ({self._errorcount})")
+        elif self._errorcount >= SLEEP_AFTER_FAILURES:
+            _LOGGER.info(
+                f"No response from Steca inverter after {self._errorcount} attempts, assuming it is asleep"
+            )
+            self.asleep = True
+            self._previous_value = None
+        else:
             _LOGGER.debug(
                 f"No response from Steca inverter. ({self._errorcount}) " + str(e)
             )
-            if self._errorcount > 5:
-                _LOGGER.warning(
-                    f"No response from Steca inverter. ({self._errorcount}) " + str(e)
-                )
-                self._previous_value = None
 
-            self._errorcount += 1
-            # return self._previous_value
+    def _PollSucceeded(self, identifier, trace, msg_response):
+        """Record a response and check its response code."""
+        self.stats.add_request(identifier, trace)
+        self._RecordFrame("rx", msg_response)
+        length = len(msg_response)
+        _LOGGER.debug(f"Received {length} bytes '{msg_response.hex()}'")
 
+        if self.asleep:
+            _LOGGER.info("Steca inverter is awake again")
+            self.asleep = False
         self._errorcount = 0
 
         try:
@@ -383,6 +1091,84 @@ class StecaConnector:
 
         except Exception:  # pylint: disable=broad-except
             _LOGGER.debug(
-                f"Fejl ved parsing af inverterdata! - det er måske overskyet eller aften/nat (output = {power_output})"
+                f"Fejl ved parsing af inverterdata! - det er måske overskyet eller aften/nat (output = {msg_response.hex()})"
             )
             return PowerOutput_MIN
+
+
+async def discover_inverters(
+    bus, addresses=DISCOVERY_ADDRESSES, timeout=DISCOVERY_TIMEOUT
+):
+    """Return the inverter addresses on the bus that answer a probe.
+
+    All probes are queued at once, the bus sends them one after the other
+    over one connection: a late answer to a probe that timed out comes from
+    an address that is not probed again, so it is ignored.
+    """
+    connectors = [
+        StecaConnector(bus._host, bus._port, bus, address) for address in addresses
+    ]
+
+    async def probe(connector):
+        try:
+            await bus.request(
+                connector.GenerateRequestTelegram(PROBE_IDENTIFIER),
+                client=connector,
+                priority=PRIORITY_LOW,
+                timeout=timeout,
+                keep_connection=True,
+            )
+        except Exception:  # pylint: disable=broad-except
+            return False
+        return True
+
+    found = await asyncio.gather(*(probe(connector) for connector in connectors))
+    return [
+        connector.address for connector, answered in zip(connectors, found) if answered
+    ]
+
+
+async def scan_gateways(
+    hosts,
+    port=SCAN_PORT,
+    concurrency=SCAN_CONCURRENCY,
+    connect_timeout=SCAN_CONNECT_TIMEOUT,
+    confirm_timeout=SCAN_CONFIRM_TIMEOUT,
+):
+    """Return the hosts with an open gateway port as (host, answered) pairs.
+
+    Every host that accepts a connection is sent a time request for the
+    default inverter address; answered tells whether a valid telegram came
+    back. Inverters do not answer at night, so hosts that only have the port
+    open are returned too. At most concurrency hosts are tried at once.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    telegram = StecaConnector(None, port).BuildRequestTelegram(
+        bytes([SCAN_IDENTIFIER])
+    )
+
+    async def probe(host):
+        async with semaphore:
+            try:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(host, port), connect_timeout
+                )
+            except (OSError, TimeoutError):
+                return None
+            decoder = StecaFrameDecoder()
+            try:
+                writer.write(telegram)
+                async with asyncio.timeout(confirm_timeout):
+                    while decoder.next_frame() is None:
+                        data = await reader.read(RESPONSE_MAX_LENGTH)
+                        if not data:
+                            return host, False
+                        decoder.feed(data)
+                return host, True
+            except (OSError, TimeoutError):
+                return host, False
+            finally:
+                writer.close()
+
+    found = await asyncio.gather(*(probe(str(host)) for host in hosts))
+    return [result for result in found if result is not None]
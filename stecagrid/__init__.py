@@ -0,0 +1,49 @@
+"""StecaGrid inverter client without Home Assistant.
+
+The protocol code of the integration (connector, gateway bus, codec,
+measurements) does not depend on Home Assistant. This package makes it
+importable on its own:
+
+    from stecagrid import StecaConnector, MEASUREMENTS_BY_KEY
+
+The modules are the ones in custom_components/stecagrid, so the integration
+and the library cannot drift apart; only the Home Assistant parts of the
+integration (its __init__, platforms and config flow) are not importable from
+here. In a checkout they are loaded from the integration directory, from the
+repository root; "pip install ." copies them into the package (see
+pyproject.toml). See __main__.py for the command line poller.
+"""
+
+import os
+
+# In a checkout, load the modules from the integration, without its Home
+# Assistant __init__
+_INTEGRATION = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), "custom_components", "stecagrid"
+)
+if os.path.isdir(_INTEGRATION):
+    __path__.append(_INTEGRATION)
+
+from .measurements import MEASUREMENTS, MEASUREMENTS_BY_KEY, Measurement  # noqa: E402
+from .steca import (  # noqa: E402
+    StecaBus,
+    StecaConnectionError,
+    StecaConnector,
+    StecaFrameDecoder,
+    StecaGatewayUnavailable,
+    discover_inverters,
+    scan_gateways,
+)
+
+__all__ = [
+    "MEASUREMENTS",
+    "MEASUREMENTS_BY_KEY",
+    "Measurement",
+    "StecaBus",
+    "StecaConnectionError",
+    "StecaConnector",
+    "StecaFrameDecoder",
+    "StecaGatewayUnavailable",
+    "discover_inverters",
+    "scan_gateways",
+]
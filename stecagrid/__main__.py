@@ -0,0 +1,268 @@
+"""Poll StecaGrid inverters and write the measurements as JSON Lines or CSV.
+
+Run from the repository root or after "pip install .", Home Assistant is not
+needed:
+
+    python -m stecagrid 192.168.1.50
+    python -m stecagrid 192.168.1.50:23/1,2 192.168.1.51 --interval 5 --count 0
+    python -m stecagrid 192.168.1.50 --format csv --output solar.csv
+
+Each target is a gateway with the inverter addresses behind it (default 1).
+Inverters behind one gateway share its connection. The polls are spread
+evenly over the interval by a StecaFleet, with at most --concurrency of them
+in flight, so hundreds of inverters are polled at a steady rate. Every poll
+writes one record; measurements that could not be read are empty and listed
+under "errors". With --capture the traffic of the gateway is also written to
+a binary capture file, see capture.py; with several gateways each gets its
+own file, named FILE.HOST_PORT.
+"""
+
+import argparse
+import asyncio
+import csv
+from datetime import datetime, timezone
+import json
+import logging
+import sys
+
+from .capture import CaptureWriter
+from .fleet import FLEET_CONCURRENCY, StecaFleet
+from .measurements import MEASUREMENTS, MEASUREMENTS_BY_KEY
+from .steca import StecaBus, StecaConnectionError, StecaConnector
+
+DEFAULT_PORT = 23
+DEFAULT_ADDRESS = 1
+DEFAULT_INTERVAL = 5.0
+# Seconds a cycle may take, see CYCLE_BUDGET of the integration
+DEFAULT_BUDGET = 3.0
+
+FORMAT_JSONL = "jsonl"
+FORMAT_CSV = "csv"
+RECORD_FIELDS = ("timestamp", "host", "port", "address")
+
+
+def parse_target(target):
+    """Return (host, port, addresses) of a "host[:port][/address,...]" target."""
+    gateway, _, addresses = target.partition("/")
+    host, _, port = gateway.rpartition(":")
+    if not host:
+        host, port = port, ""
+    try:
+        return (
+            host,
+            int(port) if port else DEFAULT_PORT,
+            [int(address) for address in addresses.split(",")]
+            if addresses
+            else [DEFAULT_ADDRESS],
+        )
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid target '{target}'") from None
+
+
+def parse_measurements(keys):
+    keys = keys.split(",")
+    unknown = [key for key in keys if key not in MEASUREMENTS_BY_KEY]
+    if unknown:
+        raise argparse.ArgumentTypeError(
+            f"unknown measurements {', '.join(unknown)}, "
+            f"choose from {', '.join(MEASUREMENTS_BY_KEY)}"
+        )
+    return [MEASUREMENTS_BY_KEY[key] for key in keys]
+
+
+class RecordWriter:
+    """Writes poll records to a text stream, flushed per cycle."""
+
+    def __init__(self, stream, fmt, keys):
+        self._stream = stream
+        self._format = fmt
+        self._csv = None
+        if fmt == FORMAT_CSV:
+            self._csv = csv.DictWriter(
+                stream, (*RECORD_FIELDS, *keys, "errors"), extrasaction="ignore"
+            )
+            # Appending to a file that already has the header
+            if not (stream.seekable() and stream.tell()):
+                self._csv.writeheader()
+
+    def write(self, record):
+        if self._csv is not None:
+            self._csv.writerow({**record, "errors": " ".join(record["errors"])})
+        else:
+            self._stream.write(json.dumps(record) + "\n")
+
+    def flush(self):
+        self._stream.flush()
+
+
+async def poll_inverter(connector, measurements, deadline):
+    """Return the record of one inverter for the current cycle."""
+    host, port = connector._host, connector._port
+    record = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+        "host": host,
+        "port": port,
+        "address": connector.address,
+        "errors": [],
+    }
+    results = await connector.GetMeasurements(measurements, deadline=deadline)
+    for key, value in results.items():
+        if isinstance(value, StecaConnectionError):
+            record[key] = None
+            record["errors"].append(key)
+        else:
+            record[key] = value
+    return record
+
+
+async def run(
+    targets,
+    measurements,
+    writer,
+    interval,
+    count,
+    budget,
+    concurrency,
+    captures=None,
+    pipeline=False,
+):
+    """Poll every inverter of the targets count times (0: until interrupted)."""
+    loop = asyncio.get_running_loop()
+    fleet = StecaFleet(concurrency)
+    buses = {}
+    connectors = []
+    for host, port, addresses in targets:
+        bus = buses.setdefault((host, port), StecaBus(host, port, pipeline))
+        connectors.extend(
+            StecaConnector(host, port, bus, address) for address in addresses
+        )
+    for gateway, bus in buses.items():
+        bus.capture = (captures or {}).get(gateway)
+    running = set()
+    done = asyncio.Event()
+
+    def member(key, connector):
+        polls = 0
+
+        async def poll():
+            nonlocal polls
+            writer.write(
+                await poll_inverter(connector, measurements, loop.time() + budget)
+            )
+            writer.flush()
+            polls += 1
+            if count and polls >= count:
+                fleet.remove(key)
+                running.discard(key)
+                if not running:
+                    done.set()
+
+        return poll
+
+    for connector in connectors:
+        key = (connector._host, connector._port, connector.address)
+        running.add(key)
+        fleet.add(key, member(key, connector), interval)
+
+    try:
+        await done.wait()
+    finally:
+        await fleet.close()
+        await asyncio.gather(*(bus.close() for bus in buses.values()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m stecagrid", description=__doc__.splitlines()[0]
+    )
+    parser.add_argument(
+        "targets",
+        nargs="+",
+        type=parse_target,
+        metavar="HOST[:PORT][/ADDRESS,...]",
+    )
+    parser.add_argument(
+        "--measurements",
+        type=parse_measurements,
+        default=list(MEASUREMENTS),
+        metavar="KEY,...",
+        help="measurements to read (default: all)",
+    )
+    parser.add_argument(
+        "--interval", type=float, default=DEFAULT_INTERVAL, help="seconds per cycle"
+    )
+    parser.add_argument(
+        "--count", type=int, default=1, help="cycles to run, 0 until interrupted"
+    )
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=DEFAULT_BUDGET,
+        help="seconds an inverter may take per cycle",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=FLEET_CONCURRENCY,
+        help="polls in flight at once",
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="send the requests of a cycle back-to-back, the gateway must buffer them",
+    )
+    parser.add_argument(
+        "--format", choices=(FORMAT_JSONL, FORMAT_CSV), default=FORMAT_JSONL
+    )
+    parser.add_argument("--output", metavar="FILE", help="file to append to")
+    parser.add_argument(
+        "--capture", metavar="FILE", help="also capture the traffic to FILE"
+    )
+    parser.add_argument("-v", "--verbose", action="store_true", help="debug log")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.WARNING, stream=sys.stderr
+    )
+
+    captures = {}
+    if args.capture:
+        gateways = {(host, port) for host, port, _ in args.targets}
+        for host, port in gateways:
+            captures[(host, port)] = CaptureWriter(
+                args.capture if len(gateways) == 1 else f"{args.capture}.{host}_{port}"
+            )
+    stream = (
+        open(args.output, "a", encoding="utf-8", newline="")
+        if args.output
+        else sys.stdout
+    )
+    try:
+        writer = RecordWriter(
+            stream, args.format, [measurement.key for measurement in args.measurements]
+        )
+        asyncio.run(
+            run(
+                args.targets,
+                args.measurements,
+                writer,
+                args.interval,
+                args.count,
+                args.budget,
+                args.concurrency,
+                captures,
+                args.pipeline,
+            )
+        )
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+        for capture in captures.values():
+            capture.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
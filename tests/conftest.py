@@ -0,0 +1,26 @@
+"""Shared test helpers."""
+
+import asyncio
+
+import pytest
+
+
+@pytest.fixture
+def run_hass(tmp_path):
+    """Return a function running a test coroutine with a Home Assistant core.
+
+    Tests using it are skipped where Home Assistant is not installed.
+    """
+    core = pytest.importorskip("homeassistant.core")
+
+    def run(test):
+        async def main():
+            hass = core.HomeAssistant(str(tmp_path))
+            try:
+                await test(hass)
+            finally:
+                await hass.async_stop(force=True)
+
+        asyncio.run(main())
+
+    return run
@@ -0,0 +1,148 @@
+"""Tests of capturing telegrams to a file and replaying them."""
+
+import asyncio
+import os
+
+import pytest
+
+from stecagrid.capture import (
+    CAPTURE_MAGIC,
+    DIRECTION_RX,
+    DIRECTION_TX,
+    CaptureReader,
+    CaptureReplay,
+    CaptureWriter,
+    load_responses,
+)
+from stecagrid.measurements import MEASUREMENTS_BY_KEY
+from stecagrid.simulator import SimulatedInverter, StecaSimulator
+from stecagrid.steca import StecaBus, StecaConnector
+
+KEYS = ("ac_power", "panel_voltage", "daily_yield")
+
+
+async def read_values(connector):
+    return [
+        await connector.GetMeasurement(MEASUREMENTS_BY_KEY[key], retries=0)
+        for key in KEYS
+    ]
+
+
+async def record_session(path, **faults):
+    """Read KEYS from a simulated gateway, capturing to path."""
+    inverter = SimulatedInverter(ac_power=1234.0, daily_yield=5678.0)
+    async with StecaSimulator([inverter], seed=3, **faults) as sim:
+        bus = StecaBus(sim.host, sim.port)
+        bus.capture = CaptureWriter(path)
+        try:
+            values = await read_values(StecaConnector(sim.host, sim.port, bus))
+        finally:
+            await bus.close()
+            bus.capture.close()
+    return values
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / "capture.bin"
+    writer = CaptureWriter(path)
+    writer.write(DIRECTION_TX, b"\x02request", now=1.0)
+    writer.write(DIRECTION_RX, bytearray(b"\x02resp"), now=1.5)
+    writer.write(DIRECTION_RX, b"", now=2.0)
+    writer.close()
+    assert writer.frames == 3
+
+    with CaptureReader(path) as capture:
+        records = [
+            (record.time, record.direction, bytes(record.frame)) for record in capture
+        ]
+    assert records == [
+        (1.0, DIRECTION_TX, b"\x02request"),
+        (1.5, DIRECTION_RX, b"\x02resp"),
+        (2.0, DIRECTION_RX, b""),
+    ]
+
+
+def test_append_to_existing_file(tmp_path):
+    path = tmp_path / "capture.bin"
+    for frame in (b"one", b"two"):
+        writer = CaptureWriter(path)
+        writer.write(DIRECTION_TX, frame)
+        writer.close()
+
+    with open(path, "rb") as file:
+        assert file.read().count(CAPTURE_MAGIC) == 1
+    with CaptureReader(path) as capture:
+        assert [bytes(record.frame) for record in capture] == [b"one", b"two"]
+
+
+def test_rotation(tmp_path):
+    path = tmp_path / "capture.bin"
+    writer = CaptureWriter(path, max_bytes=100, backups=2)
+    for index in range(20):
+        writer.write(DIRECTION_TX, bytes([index]) * 20)
+    writer.close()
+
+    assert sorted(os.listdir(tmp_path)) == [
+        "capture.bin",
+        "capture.bin.1",
+        "capture.bin.2",
+    ]
+    frames = []
+    for name in ("capture.bin.2", "capture.bin.1", "capture.bin"):
+        assert os.path.getsize(tmp_path / name) <= 100
+        with CaptureReader(tmp_path / name) as capture:
+            frames += [bytes(record.frame) for record in capture]
+    # The oldest records are gone, the newest are kept in order
+    assert frames == [bytes([index]) * 20 for index in range(20 - len(frames), 20)]
+
+
+def test_reader_rejects_other_files(tmp_path):
+    path = tmp_path / "capture.bin"
+    path.write_bytes(b"not a capture")
+    with pytest.raises(ValueError):
+        CaptureReader(path)
+
+
+def test_reader_stops_at_cut_record(tmp_path):
+    path = tmp_path / "capture.bin"
+    writer = CaptureWriter(path)
+    writer.write(DIRECTION_TX, b"complete")
+    writer.write(DIRECTION_TX, b"cut short")
+    writer.close()
+    with open(path, "r+b") as file:
+        file.truncate(os.path.getsize(path) - 3)
+
+    with CaptureReader(path) as capture:
+        assert [bytes(record.frame) for record in capture] == [b"complete"]
+
+
+def test_load_responses(tmp_path):
+    path = tmp_path / "capture.bin"
+    asyncio.run(record_session(path, split_rate=1.0, concatenate_rate=1.0))
+
+    responses = load_responses(path)
+    assert len(responses) == len(KEYS)
+    for request, recorded in responses.items():
+        assert len(recorded) == 1
+        delay, response = recorded[0]
+        assert delay >= 0
+        # Answered by the inverter addressed in the request
+        assert response[5] == request[4]
+
+
+def test_replay(tmp_path):
+    path = tmp_path / "capture.bin"
+    values = asyncio.run(record_session(path, split_rate=0.5))
+
+    async def replay():
+        async with CaptureReplay(path) as gateway:
+            connector = StecaConnector(gateway.host, gateway.port)
+            try:
+                assert await read_values(connector) == values
+                # The recorded responses are served again
+                assert await read_values(connector) == values
+            finally:
+                await connector.close()
+            assert gateway.answered == 2 * len(KEYS)
+
+    asyncio.run(replay())
@@ -0,0 +1,111 @@
+"""Tests of the command line poller."""
+
+import argparse
+import asyncio
+import csv
+import io
+import json
+
+import pytest
+
+from stecagrid.__main__ import (
+    FORMAT_CSV,
+    FORMAT_JSONL,
+    RecordWriter,
+    parse_measurements,
+    parse_target,
+    run,
+)
+from stecagrid.measurements import MEASUREMENTS_BY_KEY
+from stecagrid.simulator import SimulatedInverter, StecaSimulator
+
+
+@pytest.mark.parametrize(
+    ("target", "expected"),
+    [
+        ("192.168.1.50", ("192.168.1.50", 23, [1])),
+        ("192.168.1.50:8023", ("192.168.1.50", 8023, [1])),
+        ("gateway.local/2", ("gateway.local", 23, [2])),
+        ("192.168.1.50:23/1,2,3", ("192.168.1.50", 23, [1, 2, 3])),
+    ],
+)
+def test_parse_target(target, expected):
+    assert parse_target(target) == expected
+
+
+@pytest.mark.parametrize("target", ["host:port", "host/1,x"])
+def test_parse_invalid_target(target):
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_target(target)
+
+
+def test_parse_measurements():
+    assert parse_measurements("ac_power,daily_yield") == [
+        MEASUREMENTS_BY_KEY["ac_power"],
+        MEASUREMENTS_BY_KEY["daily_yield"],
+    ]
+    with pytest.raises(argparse.ArgumentTypeError, match="bogus"):
+        parse_measurements("ac_power,bogus")
+
+
+RECORD = {
+    "timestamp": "2024-06-01T12:00:00.000+00:00",
+    "host": "192.168.1.50",
+    "port": 23,
+    "address": 1,
+    "ac_power": 1234.0,
+    "daily_yield": None,
+    "errors": ["daily_yield"],
+}
+
+
+def test_jsonl_records():
+    stream = io.StringIO()
+    writer = RecordWriter(stream, FORMAT_JSONL, ["ac_power", "daily_yield"])
+    writer.write(RECORD)
+    writer.write(RECORD)
+    lines = stream.getvalue().splitlines()
+    assert [json.loads(line) for line in lines] == [RECORD, RECORD]
+
+
+def test_csv_records(tmp_path):
+    path = tmp_path / "solar.csv"
+    for _ in range(2):
+        with open(path, "a", encoding="utf-8", newline="") as stream:
+            writer = RecordWriter(stream, FORMAT_CSV, ["ac_power", "daily_yield"])
+            writer.write(RECORD)
+
+    with open(path, encoding="utf-8", newline="") as stream:
+        rows = list(csv.DictReader(stream))
+    # The header is only written to an empty file
+    assert len(rows) == 2
+    assert rows[0]["ac_power"] == "1234.0"
+    assert rows[0]["daily_yield"] == ""
+    assert rows[0]["errors"] == "daily_yield"
+
+
+def test_run_against_simulator():
+    async def poll():
+        inverters = [SimulatedInverter(address=1), SimulatedInverter(address=2)]
+        async with StecaSimulator(inverters) as sim:
+            stream = io.StringIO()
+            measurements = parse_measurements("ac_power,panel_voltage")
+            await run(
+                [(sim.host, sim.port, [1, 2])],
+                measurements,
+                RecordWriter(stream, FORMAT_JSONL, ["ac_power", "panel_voltage"]),
+                interval=0.1,
+                count=2,
+                budget=1.0,
+                concurrency=4,
+            )
+            # The inverters share the connection of their gateway
+            assert sim.connections == 1
+        return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+    records = asyncio.run(poll())
+    assert sorted(record["address"] for record in records) == [1, 1, 2, 2]
+    for record in records:
+        assert record["errors"] == []
+        assert record["ac_power"] is not None
+        assert record["panel_voltage"] is not None
@@ -0,0 +1,70 @@
+"""Tests of the update cycle of the coordinator, they need Home Assistant."""
+
+import pytest
+
+pytest.importorskip("homeassistant")
+
+# pylint: disable=wrong-import-position
+import custom_components.stecagrid as stecagrid
+from custom_components.stecagrid import StecaGridCoordinator, simulator, steca
+
+
+@pytest.fixture(autouse=True)
+def short_timeout(monkeypatch):
+    monkeypatch.setattr(steca, "RESPONSE_TIMEOUT", 0.1)
+    monkeypatch.setattr(steca, "RESPONSE_MIN_TIMEOUT", 0.1)
+    monkeypatch.setattr(stecagrid, "CYCLE_BUDGET", 0.5)
+
+
+def test_start_at_night(run_hass):
+    async def test(hass):
+        inverter = simulator.SimulatedInverter()
+        inverter.asleep = True
+        async with simulator.StecaSimulator([inverter]) as sim:
+            bus = steca.StecaBus(sim.host, sim.port)
+            coordinator = StecaGridCoordinator(
+                hass, steca.StecaConnector(sim.host, sim.port, bus), "test", 5
+            )
+            try:
+                # Refreshing does not raise, the first cycles fail
+                await coordinator.async_refresh()
+                assert not coordinator.last_update_success
+                for _ in range(steca.SLEEP_AFTER_FAILURES - 1):
+                    await coordinator.async_refresh()
+                # Then the inverter is asleep and reports no production
+                assert coordinator.stecaApi.asleep
+                assert coordinator.last_update_success
+                assert coordinator.data["ac_power"] == 0.0
+
+                inverter.asleep = False
+                await coordinator.async_refresh()
+                assert not coordinator.stecaApi.asleep
+                assert coordinator.data["ac_power"] == inverter.ac_power
+            finally:
+                await bus.close()
+
+    run_hass(test)
+
+
+def test_partial_cycle(run_hass):
+    async def test(hass):
+        inverter = simulator.SimulatedInverter()
+        async with simulator.StecaSimulator([inverter]) as sim:
+            bus = steca.StecaBus(sim.host, sim.port)
+            coordinator = StecaGridCoordinator(
+                hass, steca.StecaConnector(sim.host, sim.port, bus), "test", 5
+            )
+            try:
+                await coordinator.async_refresh()
+                inverter.ac_power = 1000.0
+                inverter.silent = {41}
+                coordinator._next_read.clear()
+                await coordinator.async_refresh()
+            finally:
+                await bus.close()
+        assert coordinator.last_update_success
+        # The previous value is kept and marked stale
+        assert coordinator.data["ac_power"] == 2500.0
+        assert "ac_power" in coordinator.data["stale"]
+
+    run_hass(test)
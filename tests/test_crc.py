@@ -0,0 +1,58 @@
+"""Tests of the table driven CRC routines."""
+
+import random
+
+import pytest
+
+from stecagrid.crc import (
+    CRC16_Table,
+    CRC8_Table,
+    CRC_8_OFFSET,
+    CRC_16_OFFSET,
+    crc8_block,
+    crc16_block,
+    frame_crc_ok,
+    verify_frames,
+)
+from stecagrid.simulator import build_response
+
+
+def nibble_crc(table, crc, data):
+    """The original nibble at a time algorithm."""
+    for value in data:
+        crc ^= value
+        crc = (crc >> 4) ^ table[crc & 0x0F]
+        crc = (crc >> 4) ^ table[crc & 0x0F]
+    return crc
+
+
+@pytest.mark.parametrize("length", [0, 1, 7, 64, 1024])
+def test_crc8_matches_nibble_algorithm(length):
+    rand = random.Random(length)
+    data = bytes(rand.randrange(256) for _ in range(length))
+    for crc in (0, CRC_8_OFFSET, 0xFF):
+        assert crc8_block(crc, data) == nibble_crc(CRC8_Table, crc, data)
+
+
+@pytest.mark.parametrize("length", [0, 1, 7, 64, 1024])
+def test_crc16_matches_nibble_algorithm(length):
+    rand = random.Random(length)
+    data = bytes(rand.randrange(256) for _ in range(length))
+    for crc in (0, CRC_16_OFFSET, 0xFFFF):
+        assert crc16_block(crc, data) == nibble_crc(CRC16_Table, crc, data)
+
+
+def test_crc_continues_over_blocks():
+    data = bytes(range(256))
+    assert crc16_block(crc16_block(CRC_16_OFFSET, data[:100]), data[100:]) == (
+        crc16_block(CRC_16_OFFSET, data)
+    )
+
+
+def test_frame_crc():
+    frame = build_response(1, 123, b"\x0b\x01\x00\x04\x00\x00\x00\x00")
+    assert frame_crc_ok(frame)
+    broken = bytearray(frame)
+    broken[-2] ^= 0xFF
+    assert not frame_crc_ok(broken)
+    assert verify_frames([frame, broken, frame[:5]]) == [True, False, False]
@@ -0,0 +1,63 @@
+"""Tests of the per-request deadlines of a poll cycle."""
+
+import asyncio
+
+from stecagrid.measurements import MEASUREMENTS
+from stecagrid.simulator import SimulatedInverter, StecaSimulator
+from stecagrid.steca import (
+    RESPONSE_MIN_TIMEOUT,
+    StecaConnectionError,
+    StecaConnector,
+)
+
+CYCLE_BUDGET = 3.0
+
+
+def test_lost_replies_leave_time_for_the_others():
+    async def run():
+        inverter = SimulatedInverter()
+        # Two of the first requests of the cycle get no answer
+        inverter.silent = {34, 35}
+        async with StecaSimulator([inverter]) as sim:
+            connector = StecaConnector(sim.host, sim.port)
+            loop = asyncio.get_running_loop()
+            try:
+                start = loop.time()
+                results = await connector.GetMeasurements(
+                    MEASUREMENTS, deadline=start + CYCLE_BUDGET
+                )
+                elapsed = loop.time() - start
+            finally:
+                await connector.close()
+        failed = {
+            key
+            for key, value in results.items()
+            if isinstance(value, StecaConnectionError)
+        }
+        assert failed == {"panel_power", "panel_voltage"}
+        assert elapsed < CYCLE_BUDGET + 0.1
+
+    asyncio.run(run())
+
+
+def test_deadline_bounds_the_cycle():
+    async def run():
+        inverter = SimulatedInverter()
+        inverter.asleep = True
+        async with StecaSimulator([inverter]) as sim:
+            connector = StecaConnector(sim.host, sim.port)
+            loop = asyncio.get_running_loop()
+            try:
+                start = loop.time()
+                results = await connector.GetMeasurements(
+                    MEASUREMENTS, deadline=start + 2 * RESPONSE_MIN_TIMEOUT
+                )
+                elapsed = loop.time() - start
+            finally:
+                await connector.close()
+        assert all(
+            isinstance(value, StecaConnectionError) for value in results.values()
+        )
+        assert elapsed < 2 * RESPONSE_MIN_TIMEOUT + 0.1
+
+    asyncio.run(run())
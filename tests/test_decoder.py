@@ -0,0 +1,67 @@
+"""Tests of StecaFrameDecoder on damaged and fragmented byte streams."""
+
+from stecagrid.simulator import build_response
+from stecagrid.steca import FRAME_START, StecaFrameDecoder
+
+FRAME_1 = build_response(1, 123, b"\x01\x02\x03")
+FRAME_2 = build_response(2, 123, b"\x04\x05\x06\x07")
+
+
+def frames(decoder):
+    result = []
+    while (frame := decoder.next_frame()) is not None:
+        result.append(frame)
+    return result
+
+
+def test_concatenated_frames():
+    decoder = StecaFrameDecoder()
+    decoder.feed(FRAME_1 + FRAME_2)
+    assert frames(decoder) == [FRAME_1, FRAME_2]
+    assert decoder.buffered == 0
+
+
+def test_split_frames():
+    decoder = StecaFrameDecoder()
+    received = []
+    for value in FRAME_1 + FRAME_2:
+        decoder.feed(bytes([value]))
+        received += frames(decoder)
+    assert received == [FRAME_1, FRAME_2]
+
+
+def test_resync_after_garbage():
+    decoder = StecaFrameDecoder()
+    # Garbage with start bytes in it that do not begin a valid header
+    garbage = bytes([0x55, FRAME_START, 0x00, FRAME_START, 0x01, 0x02, 0x03, 0x04])
+    decoder.feed(garbage + FRAME_1 + garbage + FRAME_2)
+    assert frames(decoder) == [FRAME_1, FRAME_2]
+    assert decoder.discarded == 2 * len(garbage)
+
+
+def test_resync_after_truncated_frame():
+    decoder = StecaFrameDecoder()
+    decoder.feed(FRAME_1[:10])
+    assert frames(decoder) == []
+    assert decoder.buffered == 10
+    # The rest of the cut short telegram never comes
+    decoder.feed(FRAME_2)
+    assert frames(decoder) == [FRAME_2]
+
+
+def test_corrupt_frame():
+    decoder = StecaFrameDecoder()
+    corrupt = bytearray(FRAME_1)
+    corrupt[-2] ^= 0xFF
+    decoder.feed(bytes(corrupt) + FRAME_2)
+    assert frames(decoder) == [FRAME_2]
+    assert decoder.crc_errors
+    assert decoder.corrupt_sender == 1
+    decoder.reset()
+    assert decoder.corrupt_sender is None
+
+
+def test_oversized_length_is_skipped():
+    decoder = StecaFrameDecoder(max_length=len(FRAME_1))
+    decoder.feed(FRAME_2 + FRAME_1)
+    assert frames(decoder) == [FRAME_1]
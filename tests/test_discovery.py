@@ -0,0 +1,68 @@
+"""Tests of finding gateways and the inverters behind them."""
+
+import asyncio
+import ipaddress
+import socket
+
+from stecagrid.simulator import SimulatedInverter, StecaSimulator
+from stecagrid.steca import StecaBus, discover_inverters, scan_gateways
+
+
+def test_discover_inverters():
+    async def run():
+        inverters = [SimulatedInverter(address=1), SimulatedInverter(address=3)]
+        async with StecaSimulator(inverters) as sim:
+            bus = StecaBus(sim.host, sim.port)
+            try:
+                found = await discover_inverters(bus, range(1, 6), timeout=0.1)
+            finally:
+                await bus.close()
+            assert found == [1, 3]
+            # Probes without answer keep the connection
+            assert sim.connections == 1
+
+    asyncio.run(run())
+
+
+def test_discover_skips_sleeping_inverters():
+    async def run():
+        sleeping = SimulatedInverter(address=2)
+        sleeping.asleep = True
+        async with StecaSimulator([SimulatedInverter(), sleeping]) as sim:
+            bus = StecaBus(sim.host, sim.port)
+            try:
+                assert await discover_inverters(bus, [1, 2], timeout=0.1) == [1]
+            finally:
+                await bus.close()
+
+    asyncio.run(run())
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_scan_gateways():
+    async def run():
+        inverter = SimulatedInverter()
+        async with StecaSimulator([inverter]) as sim:
+            # Only the first host has the port open
+            hosts = ipaddress.ip_network("127.0.0.0/30").hosts()
+            found = await scan_gateways(hosts, sim.port, confirm_timeout=0.2)
+            assert found == [("127.0.0.1", True)]
+
+            # At night the gateway is found, but not confirmed
+            inverter.asleep = True
+            found = await scan_gateways(["127.0.0.1"], sim.port, confirm_timeout=0.2)
+            assert found == [("127.0.0.1", False)]
+
+    asyncio.run(run())
+
+
+def test_scan_without_gateways():
+    async def run():
+        return await scan_gateways(["127.0.0.1"], free_port())
+
+    assert asyncio.run(run()) == []
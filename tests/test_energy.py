@@ -0,0 +1,81 @@
+"""Tests of the lifetime energy counter."""
+
+import pytest
+
+from stecagrid.energy import EnergyIntegrator
+
+
+def test_integrates_power():
+    energy = EnergyIntegrator()
+    energy.add_power(1000.0, 0.0)
+    energy.add_power(3000.0, 36.0)
+    assert energy.total == pytest.approx(20.0)
+
+
+def test_gap_is_not_integrated():
+    energy = EnergyIntegrator(max_gap=60.0)
+    energy.add_power(1000.0, 0.0)
+    energy.add_power(1000.0, 120.0)
+    assert energy.total == 0.0
+    energy.add_gap()
+    energy.add_power(1000.0, 130.0)
+    assert energy.total == 0.0
+
+
+def test_daily_yield_anchors_counter():
+    energy = EnergyIntegrator(total=1000.0)
+    energy.add_daily_yield(200.0, "2026-06-01")
+    assert energy.base == 800.0
+    energy.add_daily_yield(500.0, "2026-06-01")
+    assert energy.total == 1300.0
+
+
+def test_counter_never_decreases():
+    energy = EnergyIntegrator()
+    energy.add_daily_yield(100.0, "2026-06-01")
+    energy.add_power(3600.0, 0.0)
+    energy.add_power(3600.0, 50.0)
+    energy.add_daily_yield(120.0, "2026-06-01")
+    assert energy.total == pytest.approx(150.0)
+
+
+def test_drop_on_same_day_is_ignored():
+    energy = EnergyIntegrator()
+    energy.add_daily_yield(5000.0, "2026-06-01")
+    energy.add_daily_yield(0.0, "2026-06-01")
+    assert energy.total == 5000.0
+    assert energy.last_yield == 5000.0
+    energy.add_daily_yield(5100.0, "2026-06-01")
+    assert energy.total == 5100.0
+
+
+def test_drop_on_new_day_starts_day():
+    energy = EnergyIntegrator()
+    energy.add_daily_yield(5000.0, "2026-06-01")
+    energy.add_daily_yield(100.0, "2026-06-02")
+    assert energy.base == 5000.0
+    assert energy.total == 5100.0
+
+
+def test_drop_after_sleep_starts_day():
+    energy = EnergyIntegrator()
+    energy.add_power(1000.0, 0.0)
+    energy.add_daily_yield(5000.0, "2026-06-01")
+    energy.add_sleep()
+    assert energy.day is None
+    # Integration does not bridge the night
+    energy.add_power(1000.0, 10.0)
+    assert energy.total == 5000.0
+    energy.add_daily_yield(100.0, "2026-06-01")
+    assert energy.total == 5100.0
+
+
+def test_zero_power_is_integrated():
+    energy = EnergyIntegrator()
+    energy.add_power(1000.0, 0.0)
+    energy.add_power(0.0, 36.0)
+    energy.add_power(0.0, 72.0)
+    assert energy.total == pytest.approx(5.0)
+    # No gap after the zero readings
+    energy.add_power(1000.0, 108.0)
+    assert energy.total == pytest.approx(10.0)
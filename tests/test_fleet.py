@@ -0,0 +1,157 @@
+"""Tests of the StecaFleet poll scheduler."""
+
+import asyncio
+
+import pytest
+
+from stecagrid.fleet import StecaFleet
+
+
+def recorder(times, key, duration=0.0, result=None):
+    """Return a poll function appending its start times to times[key]."""
+
+    async def poll():
+        times.setdefault(key, []).append(asyncio.get_running_loop().time())
+        if duration:
+            await asyncio.sleep(duration)
+        return result
+
+    return poll
+
+
+def test_phases_are_spread():
+    async def run():
+        times = {}
+        fleet = StecaFleet()
+        start = asyncio.get_running_loop().time()
+        for key in range(5):
+            fleet.add(key, recorder(times, key), 0.5)
+        await asyncio.sleep(0.55)
+        await fleet.close()
+
+        first = sorted(polls[0] - start for polls in times.values())
+        assert len(first) == 5
+        assert first[-1] < 0.5
+        assert min(b - a for a, b in zip(first, first[1:])) > 0.05
+
+    asyncio.run(run())
+
+
+def test_members_keep_their_interval():
+    async def run():
+        times = {}
+        fleet = StecaFleet()
+        fleet.add("a", recorder(times, "a"), 0.1)
+        await asyncio.sleep(0.45)
+        await fleet.close()
+
+        polls = times["a"]
+        assert len(polls) == 5
+        for a, b in zip(polls, polls[1:]):
+            assert b - a == pytest.approx(0.1, abs=0.03)
+
+    asyncio.run(run())
+
+
+def test_poll_returns_next_interval():
+    async def run():
+        times = {}
+        fleet = StecaFleet()
+        fleet.add("a", recorder(times, "a", result=0.2), 0.05)
+        await asyncio.sleep(0.3)
+        await fleet.close()
+
+        assert len(times["a"]) == 2
+        assert times["a"][1] - times["a"][0] == pytest.approx(0.2, abs=0.03)
+
+    asyncio.run(run())
+
+
+def test_concurrency_is_bounded():
+    async def run():
+        in_flight = 0
+        most = 0
+        polled = set()
+
+        def member(key):
+            async def poll():
+                nonlocal in_flight, most
+                polled.add(key)
+                in_flight += 1
+                most = max(most, in_flight)
+                await asyncio.sleep(0.1)
+                in_flight -= 1
+
+            return poll
+
+        fleet = StecaFleet(concurrency=2)
+        for key in range(6):
+            fleet.add(key, member(key), 0.05)
+        await asyncio.sleep(0.5)
+        await fleet.close()
+
+        assert most == 2
+        assert polled == set(range(6))
+
+    asyncio.run(run())
+
+
+def test_removed_members_are_not_polled():
+    async def run():
+        times = {}
+        fleet = StecaFleet()
+        fleet.add("a", recorder(times, "a"), 0.1)
+        fleet.add("b", recorder(times, "b"), 0.1)
+        fleet.remove("b")
+        await asyncio.sleep(0.15)
+        polls = len(times["a"])
+        fleet.remove("a")
+        await asyncio.sleep(0.2)
+        assert len(fleet) == 0
+        await fleet.close()
+
+        assert "b" not in times
+        assert len(times["a"]) == polls
+
+    asyncio.run(run())
+
+
+def test_overrun_skips_missed_polls():
+    async def run():
+        times = {}
+        durations = iter([0.25])
+
+        async def poll():
+            times.setdefault("a", []).append(asyncio.get_running_loop().time())
+            await asyncio.sleep(next(durations, 0.0))
+
+        fleet = StecaFleet()
+        fleet.add("a", poll, 0.1)
+        await asyncio.sleep(0.35)
+        await fleet.close()
+
+        polls = times["a"]
+        # The polls due at 0.1 and 0.2 are skipped, not run back-to-back
+        assert len(polls) == 2
+        assert polls[1] - polls[0] == pytest.approx(0.3, abs=0.03)
+
+    asyncio.run(run())
+
+
+def test_failing_poll_stays_scheduled():
+    async def run():
+        calls = 0
+
+        async def poll():
+            nonlocal calls
+            calls += 1
+            raise ConnectionError("gateway down")
+
+        fleet = StecaFleet()
+        fleet.add("a", poll, 0.05)
+        await asyncio.sleep(0.17)
+        await fleet.close()
+
+        assert calls >= 3
+
+    asyncio.run(run())
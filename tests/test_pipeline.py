@@ -0,0 +1,81 @@
+"""Tests of request pipelining in StecaBus against the simulated gateway."""
+
+import asyncio
+
+from stecagrid.measurements import MEASUREMENTS
+from stecagrid.simulator import StecaSimulator
+from stecagrid.steca import PIPELINE_MAX_LOSSES, StecaBus, StecaConnector
+
+BATCH_TIMEOUT = 0.3
+
+
+async def request_batches(bus, count):
+    """Send count batches of every measurement, return the failures."""
+    connector = StecaConnector(bus._host, bus._port, bus)
+    requests = [
+        connector.GenerateRequestTelegram(measurement.identifier)
+        for measurement in MEASUREMENTS
+    ]
+    failures = 0
+    for _ in range(count):
+        responses = await bus.request_batch(requests, timeout=BATCH_TIMEOUT)
+        failures += sum(isinstance(response, Exception) for response in responses)
+    return failures
+
+
+def test_serial_by_default():
+    async def run():
+        async with StecaSimulator(queue_depth=0) as sim:
+            bus = StecaBus(sim.host, sim.port)
+            try:
+                assert await request_batches(bus, 2) == 0
+            finally:
+                await bus.close()
+            assert sim.dropped == 0
+
+    asyncio.run(run())
+
+
+def test_pipelining():
+    async def run():
+        async with StecaSimulator(seed=1) as sim:
+            bus = StecaBus(sim.host, sim.port, pipeline=True)
+            try:
+                assert await request_batches(bus, 3) == 0
+            finally:
+                await bus.close()
+            assert bus._pipeline_suspended_until == 0
+            assert sim.connections == 1
+
+    asyncio.run(run())
+
+
+def test_pipelining_falls_back_when_gateway_drops_requests():
+    async def run():
+        async with StecaSimulator(queue_depth=1, latency=0.03) as sim:
+            bus = StecaBus(sim.host, sim.port, pipeline=True)
+            try:
+                assert await request_batches(bus, PIPELINE_MAX_LOSSES) > 0
+                assert bus._pipeline_suspended_until > 0
+                dropped = sim.dropped
+                # One at a time from now on
+                assert await request_batches(bus, 1) == 0
+                assert sim.dropped == dropped
+            finally:
+                await bus.close()
+
+    asyncio.run(run())
+
+
+def test_line_noise_does_not_suspend_pipelining():
+    async def run():
+        async with StecaSimulator(corrupt_rate=0.5, seed=2) as sim:
+            bus = StecaBus(sim.host, sim.port, pipeline=True)
+            try:
+                assert await request_batches(bus, PIPELINE_MAX_LOSSES + 1) > 0
+            finally:
+                await bus.close()
+            assert bus._pipeline_suspended_until == 0
+            assert not any(bus._pipeline_losses)
+
+    asyncio.run(run())
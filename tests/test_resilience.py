@@ -0,0 +1,146 @@
+"""Tests of the retry policy, the circuit breaker and reconnecting."""
+
+import asyncio
+import socket
+import time
+
+import pytest
+
+from stecagrid import steca
+from stecagrid.measurements import MEASUREMENTS
+from stecagrid.resilience import (
+    BREAKER_FAILURES,
+    STATE_CLOSED,
+    STATE_HALF_OPEN,
+    STATE_OPEN,
+    CircuitBreaker,
+    backoff_delay,
+)
+from stecagrid.simulator import StecaSimulator
+from stecagrid.steca import (
+    SLEEP_AFTER_FAILURES,
+    StecaBus,
+    StecaConnector,
+    StecaGatewayUnavailable,
+)
+
+
+class DroppingSimulator(StecaSimulator):
+    """Simulator that can drop the open client connections."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._writers = []
+
+    async def _handle(self, reader, writer):
+        self._writers.append(writer)
+        await super()._handle(reader, writer)
+
+    def drop_connections(self):
+        for writer in self._writers:
+            writer.close()
+        self._writers.clear()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_backoff_delay():
+    for attempt in range(10):
+        delay = backoff_delay(attempt, base=0.1, maximum=1.0)
+        limit = min(1.0, 0.1 * 2**attempt)
+        assert limit / 2 <= delay <= limit
+
+
+def test_breaker_opens_after_failures():
+    breaker = CircuitBreaker(failures=3, reset=60.0)
+    for _ in range(2):
+        breaker.record_failure()
+        assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == STATE_OPEN
+    assert not breaker.allow()
+    assert breaker.rejected == 1
+    assert 0 < breaker.retry_in() <= 60.0
+
+
+def test_breaker_lets_one_probe_through():
+    breaker = CircuitBreaker(failures=1, reset=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == STATE_HALF_OPEN
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == STATE_CLOSED
+    assert breaker.failures == 0
+    assert breaker.allow()
+
+
+def test_breaker_reset_doubles_while_down():
+    breaker = CircuitBreaker(failures=1, reset=0.05, reset_max=0.15)
+    breaker.record_failure()
+    for reset in (0.1, 0.15, 0.15):
+        time.sleep(breaker.retry_in() + 0.01)
+        assert breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == STATE_OPEN
+        assert breaker.reset == pytest.approx(reset)
+
+    time.sleep(breaker.retry_in() + 0.01)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.reset == pytest.approx(0.05)
+
+
+def test_unreachable_gateway_opens_the_breaker():
+    async def run():
+        bus = StecaBus("127.0.0.1", free_port())
+        connector = StecaConnector(bus._host, bus._port, bus)
+        request = connector.GenerateRequestTelegram(MEASUREMENTS[0].identifier)
+        try:
+            for _ in range(BREAKER_FAILURES):
+                with pytest.raises(OSError):
+                    await bus.request(request)
+            with pytest.raises(StecaGatewayUnavailable):
+                await bus.request(request)
+            assert bus.breaker.rejected == 1
+        finally:
+            await bus.close()
+
+    asyncio.run(run())
+
+
+def test_reconnect_after_connection_loss():
+    async def run():
+        async with DroppingSimulator() as sim:
+            connector = StecaConnector(sim.host, sim.port)
+            try:
+                assert await connector.GetACOutput() is not None
+                sim.drop_connections()
+                await asyncio.sleep(0.05)
+                assert await connector.GetACOutput() is not None
+            finally:
+                await connector.close()
+            assert sim.connections == 2
+
+    asyncio.run(run())
+
+
+def test_corrupt_responses_do_not_count_as_sleep():
+    async def run():
+        async with StecaSimulator(corrupt_rate=1.0) as sim:
+            connector = StecaConnector(sim.host, sim.port)
+            try:
+                for _ in range(SLEEP_AFTER_FAILURES):
+                    with pytest.raises(steca.StecaConnectionError):
+                        await connector.GetMeasurement(MEASUREMENTS[0], retries=0)
+                assert not connector.asleep
+            finally:
+                await connector.close()
+
+    asyncio.run(run())
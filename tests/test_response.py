@@ -0,0 +1,102 @@
+"""Tests of the value record parser and the measurement decoding."""
+
+import pytest
+
+from stecagrid.measurements import MEASUREMENTS_BY_KEY, VALUE_RECORD_OFFSET
+from stecagrid.response import (
+    FORMULA_NOT_AVAILABLE,
+    StecaResponse,
+    float_to_record,
+    value_to_float,
+)
+from stecagrid.simulator import DATA_START, build_response
+from stecagrid.steca import StecaConnector, StecaInvalidResponse
+
+AC_POWER = MEASUREMENTS_BY_KEY["ac_power"]
+
+
+def value_response(identifier, padding, *records):
+    """Return a response with records behind the identifier and padding."""
+    assert DATA_START + 1 + len(padding) == VALUE_RECORD_OFFSET
+    return build_response(1, 123, bytes([identifier]) + padding + b"".join(records))
+
+
+def decode(measurement, frame):
+    return StecaConnector("127.0.0.1", 23)._DecodeMeasurement(measurement, frame)
+
+
+@pytest.mark.parametrize("value", [0.0, 1.5, 2500.0, 7999.0])
+def test_record_round_trip(value):
+    record = float_to_record(0x0B, value)
+    assert value_to_float(*record[1:]) == pytest.approx(value, rel=1e-5)
+
+
+def test_walks_records():
+    frame = value_response(
+        41,
+        bytes(10),
+        float_to_record(0x0B, 100.0),
+        bytes([FORMULA_NOT_AVAILABLE, 1, 2, 3]),
+        float_to_record(0x05, 600.0),
+    )
+    response = StecaResponse(frame, VALUE_RECORD_OFFSET)
+    assert len(response) == 3
+    assert [response.formula_at(index) for index in range(3)] == [0x0B, 0, 0x05]
+    assert response.value_at(0) == 100.0
+    assert response.value_at(1) is None
+    assert response.value(0x05) == 600.0
+    with pytest.raises(KeyError):
+        response.value(0x09)
+    assert len(StecaResponse(frame, VALUE_RECORD_OFFSET, 1)) == 1
+
+
+def test_formula_code_in_value_bytes():
+    # A value byte of 267 W is 0x0B, the padding holds 0x0B too
+    record = float_to_record(0x0B, 267.0)
+    assert record[1] == 0x0B
+    frame = value_response(41, bytes([0x0B] * 10), record)
+    assert decode(AC_POWER, frame) == 267.0
+    assert StecaResponse(frame, VALUE_RECORD_OFFSET).positions == [VALUE_RECORD_OFFSET]
+
+
+def test_formula_code_in_padding_of_other_measurements():
+    measurement = MEASUREMENTS_BY_KEY["panel_voltage"]
+    padding = bytes([0x05, 0x00, 0x00, 0x47] + [0x05] * 6)
+    frame = value_response(35, padding, float_to_record(0x05, 600.0))
+    assert decode(measurement, frame) == 600.0
+
+
+def test_no_production():
+    # The record at the offset is not AC power, a later one must not be used
+    frame = value_response(
+        41, bytes(10), float_to_record(0x05, 600.0), float_to_record(0x0B, 2500.0)
+    )
+    assert decode(AC_POWER, frame) == 0.0
+    frame = value_response(41, bytes(10), bytes([FORMULA_NOT_AVAILABLE, 0, 0, 0]))
+    assert decode(AC_POWER, frame) == 0.0
+
+
+def test_range_check():
+    frame = value_response(41, bytes(10), float_to_record(0x0B, 20000.0))
+    with pytest.raises(StecaInvalidResponse):
+        decode(AC_POWER, frame)
+
+
+def test_incomplete_response():
+    frame = build_response(1, 123, bytes([41]) + bytes(10))
+    with pytest.raises(StecaInvalidResponse):
+        decode(AC_POWER, frame)
+    with pytest.raises(StecaInvalidResponse):
+        decode(AC_POWER, "Service Not Supported by inverter")
+
+
+def test_time():
+    measurement = MEASUREMENTS_BY_KEY["time"]
+    data = bytearray([4])
+    for value in (2026, 6, 1, 12, 30, 5):
+        data += bytes([0x0C]) + value.to_bytes(2, "big") + b"\x00"
+    assert decode(measurement, build_response(1, 123, bytes(data))) == (
+        "2026-06-01 12:30:05"
+    )
+    with pytest.raises(StecaInvalidResponse):
+        decode(measurement, build_response(1, 123, bytes(data[:9])))
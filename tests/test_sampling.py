@@ -0,0 +1,61 @@
+"""Tests of the in-memory sample rings."""
+
+import pytest
+
+from stecagrid.sampling import SampleRing, downsample
+
+
+def test_drain_summarizes_pending_samples():
+    ring = SampleRing(8)
+    assert ring.drain() is None
+    for index, value in enumerate((100.0, 300.0, 200.0)):
+        ring.add(value, float(index))
+    assert ring.drain() == {
+        "min": 100.0,
+        "max": 300.0,
+        "mean": pytest.approx(200.0),
+        "last": 200.0,
+        "samples": 3,
+    }
+    # Drained samples are not summarized again
+    assert ring.drain() is None
+    ring.add(50.0, 3.0)
+    assert ring.drain()["samples"] == 1
+
+
+def test_drain_after_wrapping():
+    ring = SampleRing(4)
+    for index in range(10):
+        ring.add(float(index), float(index))
+    summary = ring.drain()
+    # Only the samples still in the ring
+    assert summary["samples"] == 4
+    assert summary["min"] == 6.0
+    assert summary["last"] == 9.0
+    assert ring.count == 10
+
+
+def test_samples_oldest_first():
+    ring = SampleRing(4)
+    assert ring.samples() == []
+    for index in range(6):
+        ring.add(index * 10.0, float(index))
+    assert ring.samples() == [(2.0, 20.0), (3.0, 30.0), (4.0, 40.0), (5.0, 50.0)]
+    assert ring.samples(2) == [(4.0, 40.0), (5.0, 50.0)]
+    assert len(ring.samples(100)) == 4
+
+
+def test_downsample():
+    samples = [(float(second), float(second)) for second in range(100)]
+    buckets = downsample(samples, 10.0, 50.0, 4)
+    assert [bucket["start"] for bucket in buckets] == [10.0, 20.0, 30.0, 40.0]
+    assert buckets[0] == {"start": 10.0, "min": 10.0, "max": 19.0, "mean": 14.5}
+    assert buckets[-1]["max"] == 49.0
+
+
+def test_downsample_skips_empty_buckets():
+    samples = [(0.0, 1.0), (1.0, 3.0), (9.5, 7.0)]
+    buckets = downsample(samples, 0.0, 10.0, 5)
+    assert [bucket["start"] for bucket in buckets] == [0.0, 8.0]
+    assert buckets[0]["mean"] == 2.0
+    assert downsample(samples, 20.0, 30.0, 5) == []
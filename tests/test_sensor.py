@@ -0,0 +1,98 @@
+"""Tests of the sensor updates, they need Home Assistant."""
+
+import pytest
+
+pytest.importorskip("homeassistant")
+
+# pylint: disable=wrong-import-position
+from custom_components.stecagrid import StecaGridCoordinator, simulator, steca
+from custom_components.stecagrid.sensor import (
+    SENSORS_INVERTER,
+    StecagridEnergySensor,
+    StecagridSensor,
+)
+
+DESCRIPTIONS = {description.key: description for description in SENSORS_INVERTER}
+
+
+def add_sensor(coordinator, sensor, writes):
+    """Follow the coordinator, counting the state writes of sensor."""
+    sensor.async_write_ha_state = lambda: writes.append(sensor.native_value)
+    coordinator.async_add_listener(sensor._handle_coordinator_update)
+    return sensor
+
+
+async def run_cycles(hass, heartbeat, cycles):
+    """Return the state writes of some sensors over unchanged cycles."""
+    async with simulator.StecaSimulator() as sim:
+        bus = steca.StecaBus(sim.host, sim.port)
+        coordinator = StecaGridCoordinator(
+            hass,
+            steca.StecaConnector(sim.host, sim.port, bus),
+            "test",
+            5,
+            heartbeat,
+        )
+        writes = {key: [] for key in ("ac_power", "cycle_duration", "energy")}
+        for key in ("ac_power", "cycle_duration"):
+            add_sensor(
+                coordinator,
+                StecagridSensor(coordinator, DESCRIPTIONS[key], None),
+                writes[key],
+            )
+        add_sensor(coordinator, StecagridEnergySensor(coordinator), writes["energy"])
+        try:
+            data = []
+            for _ in range(cycles):
+                await coordinator.async_refresh()
+                data.append(coordinator.data)
+        finally:
+            await bus.close()
+    assert all(cycle == data[0] for cycle in data)
+    return writes
+
+
+def test_unchanged_data_is_not_written(run_hass):
+    async def test(hass):
+        writes = await run_cycles(hass, heartbeat=3600, cycles=3)
+        assert writes["ac_power"] == [2500.0]
+
+    run_hass(test)
+
+
+def test_heartbeat_with_unchanged_data(run_hass):
+    async def test(hass):
+        writes = await run_cycles(hass, heartbeat=0, cycles=3)
+        assert writes["ac_power"] == [2500.0] * 3
+        # Not part of the data, still follows every cycle
+        assert len(writes["cycle_duration"]) == 3
+        assert len(writes["energy"]) == 3
+
+    run_hass(test)
+
+
+def test_energy_at_dusk(run_hass):
+    async def test(hass):
+        inverter = simulator.SimulatedInverter(ac_power=1000.0, daily_yield=5000.0)
+        async with simulator.StecaSimulator([inverter]) as sim:
+            bus = steca.StecaBus(sim.host, sim.port)
+            coordinator = StecaGridCoordinator(
+                hass, steca.StecaConnector(sim.host, sim.port, bus), "test", 5
+            )
+            writes = []
+            sensor = add_sensor(coordinator, StecagridEnergySensor(coordinator), writes)
+            try:
+                await coordinator.async_refresh()
+                # The inverter stops producing and answers without a value
+                inverter.ac_power = 0.0
+                coordinator._next_read.clear()
+                await coordinator.async_refresh()
+            finally:
+                await bus.close()
+        assert coordinator.data["ac_power"] == 0.0
+        assert not coordinator.data["stale"]
+        # Still integrating, not a gap
+        assert sensor._energy._power == 0.0
+        assert writes[-1] >= 5000.0
+
+    run_hass(test)
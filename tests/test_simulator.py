@@ -0,0 +1,102 @@
+"""Tests of the simulated gateway the other tests run against."""
+
+import asyncio
+
+import pytest
+
+from stecagrid.crc import frame_crc_ok
+from stecagrid.measurements import MEASUREMENTS, MEASUREMENTS_BY_KEY
+from stecagrid.simulator import (
+    RESPONSE_NOT_SUPPORTED,
+    SimulatedInverter,
+    StecaSimulator,
+    build_response,
+)
+from stecagrid.steca import StecaBus, StecaConnectionError, StecaConnector
+
+
+def test_build_response():
+    frame = build_response(1, 123, b"\x29")
+    assert frame_crc_ok(frame)
+    assert frame[4:6] == bytes([123, 1])
+    assert frame[11] == 0x29
+
+
+def test_inverter_responses():
+    inverter = SimulatedInverter(address=3)
+    for measurement in MEASUREMENTS:
+        frame = inverter.respond(measurement.identifier)
+        assert frame_crc_ok(frame)
+        assert frame[5] == 3
+    assert inverter.requests == len(MEASUREMENTS)
+
+    inverter.not_supported.add(41)
+    assert inverter.respond(41)[8] == RESPONSE_NOT_SUPPORTED
+    inverter.asleep = True
+    assert inverter.respond(41) is None
+
+
+def test_measurements_round_trip():
+    async def run():
+        inverter = SimulatedInverter(ac_power=1234.5, daily_yield=4321.0)
+        async with StecaSimulator([inverter]) as sim:
+            connector = StecaConnector(sim.host, sim.port)
+            try:
+                values = await connector.GetMeasurements(MEASUREMENTS)
+            finally:
+                await connector.close()
+        assert values["ac_power"] == 1234.5
+        assert values["daily_yield"] == 4321.0
+        assert values["nominal_power"] == inverter.nominal_power
+        assert not any(isinstance(value, Exception) for value in values.values())
+
+    asyncio.run(run())
+
+
+def test_inverters_on_one_gateway():
+    async def run():
+        inverters = [SimulatedInverter(1, ac_power=100.0), SimulatedInverter(2)]
+        async with StecaSimulator(inverters) as sim:
+            bus = StecaBus(sim.host, sim.port)
+            first = StecaConnector(sim.host, sim.port, bus, 1)
+            second = StecaConnector(sim.host, sim.port, bus, 2)
+            try:
+                assert await first.GetACOutput() == 100.0
+                assert await second.GetACOutput() == inverters[1].ac_power
+            finally:
+                await bus.close()
+            assert sim.connections == 1
+
+    asyncio.run(run())
+
+
+def test_faults_are_survived():
+    async def run():
+        async with StecaSimulator(split_rate=0.5, concatenate_rate=0.5, seed=3) as sim:
+            connector = StecaConnector(sim.host, sim.port)
+            try:
+                for _ in range(5):
+                    assert await connector.GetACOutput() == 2500.0
+            finally:
+                await connector.close()
+
+    asyncio.run(run())
+
+
+def test_silent_inverter(monkeypatch):
+    monkeypatch.setattr("stecagrid.steca.RESPONSE_TIMEOUT", 0.1)
+
+    async def run():
+        inverter = SimulatedInverter()
+        inverter.asleep = True
+        async with StecaSimulator([inverter]) as sim:
+            connector = StecaConnector(sim.host, sim.port)
+            try:
+                with pytest.raises(StecaConnectionError):
+                    await connector.GetMeasurement(
+                        MEASUREMENTS_BY_KEY["ac_power"], retries=0
+                    )
+            finally:
+                await connector.close()
+
+    asyncio.run(run())
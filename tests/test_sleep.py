@@ -0,0 +1,78 @@
+"""Tests of the sleep detection of StecaConnector."""
+
+import asyncio
+
+import pytest
+
+from stecagrid import steca
+from stecagrid.simulator import SimulatedInverter, StecaSimulator
+from stecagrid.steca import SLEEP_AFTER_FAILURES, StecaConnector
+
+
+@pytest.fixture(autouse=True)
+def short_timeout(monkeypatch):
+    monkeypatch.setattr(steca, "RESPONSE_TIMEOUT", 0.1)
+
+
+def test_asleep_after_unanswered_requests():
+    async def run():
+        inverter = SimulatedInverter()
+        async with StecaSimulator([inverter]) as sim:
+            connector = StecaConnector(sim.host, sim.port)
+            try:
+                assert await connector.Probe()
+                inverter.asleep = True
+                for _ in range(SLEEP_AFTER_FAILURES - 1):
+                    assert not await connector.Probe()
+                    assert not connector.asleep
+                assert not await connector.Probe()
+                assert connector.asleep
+
+                inverter.asleep = False
+                assert await connector.Probe()
+                assert not connector.asleep
+            finally:
+                await connector.close()
+
+    asyncio.run(run())
+
+
+def test_answer_resets_failure_count():
+    async def run():
+        inverter = SimulatedInverter()
+        async with StecaSimulator([inverter]) as sim:
+            connector = StecaConnector(sim.host, sim.port)
+            try:
+                for _ in range(2):
+                    inverter.asleep = True
+                    for _ in range(SLEEP_AFTER_FAILURES - 1):
+                        assert not await connector.Probe()
+                    inverter.asleep = False
+                    assert await connector.Probe()
+                assert not connector.asleep
+            finally:
+                await connector.close()
+
+    asyncio.run(run())
+
+
+def test_no_retries_while_asleep():
+    async def run():
+        inverter = SimulatedInverter()
+        inverter.asleep = True
+        async with StecaSimulator([inverter]) as sim:
+            connector = StecaConnector(sim.host, sim.port)
+            try:
+                for _ in range(SLEEP_AFTER_FAILURES):
+                    await connector.Probe()
+                assert connector.asleep
+                loop = asyncio.get_running_loop()
+                start = loop.time()
+                with pytest.raises(steca.StecaConnectionError):
+                    await connector.GetACOutput()
+                # One timeout, no retries with backoff
+                assert loop.time() - start < 0.25
+            finally:
+                await connector.close()
+
+    asyncio.run(run())